@@ -1,18 +1,18 @@
-from django.db.models import Value
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from core.loaders import RecipeViewerState, get_loader
+from core.search import search_recipes
+from core.tag_mask import get_mask, tag_bits, with_any_tag
+from recipes.models import Recipe, RecipeTag
 
 
 class RecipeFilter(FilterSet):
-    """Фильтр рецептов по тегам, автору,
+    """Фильтр рецептов по тегам, автору, тексту
     и спискам рецептов в избранном и списке покупок
     """
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
-    )
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [(slug, slug) for slug in tag_bits.get()],
+        method='filter_tags')
     author = filters.NumberFilter(
         field_name='author__id',
     )
@@ -20,30 +20,40 @@ class RecipeFilter(FilterSet):
         method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов.
+
+        Условие на маску тегов рецепта без соединений, если хотя бы
+        у одного тега нет бита - подзапрос к RecipeTag.
+        """
+        if not value:
+            return queryset
+        slug_bits = tag_bits.get()
+        bits = [slug_bits[slug] for slug in value]
+        if None in bits:
+            return queryset.filter(id__in=RecipeTag.objects.filter(
+                tag__slug__in=value).values('recipe_id'))
+        return with_any_tag(queryset, get_mask(bits))
 
     def filter_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user
-                                   ).annotate(is_favorited=Value(True))
+            get_loader(self.request, RecipeViewerState).all_favorited = True
+            return queryset.filter(favorites__user=self.request.user)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(shoppingcart__user=self.request.user
-                                   ).annotate(is_in_shopping_cart=Value(True))
+            get_loader(self.request,
+                       RecipeViewerState).all_in_shopping_cart = True
+            return queryset.filter(shoppingcart__user=self.request.user)
         return queryset
 
-    class Meta:
-        model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
-
-
-class IngredientFilter(FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     class Meta:
-        model = Ingredient
-        fields = ('name',)
+        model = Recipe
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search')
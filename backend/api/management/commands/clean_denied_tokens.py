@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import DeniedToken
+
+
+class Command(BaseCommand):
+    """Команда для удаления истекших отозванных refresh-токенов."""
+    help = 'Delete expired entries of the JWT refresh token denylist'
+
+    def handle(self, *args, **options):
+        count, _ = DeniedToken.objects.filter(
+            expires_at__lte=timezone.now()).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено отозванных токенов: {count}'))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.uploads import delete_upload
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    """Команда для удаления устаревших загрузок картинок."""
+    help = 'Delete image uploads older than UPLOAD_EXPIRE_HOURS'
+
+    def handle(self, *args, **options):
+        expired = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(
+                hours=settings.UPLOAD_EXPIRE_HOURS))
+        count = 0
+        for upload in expired.iterator():
+            delete_upload(upload)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено загрузок: {count}'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.images import render_variants, save_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для создания уменьшенных копий картинок рецептов."""
+    help = 'Create resized image variants for recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.only('id', 'image')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        for recipe in recipes.iterator():
+            try:
+                variants = render_variants(recipe.image.name)
+            except OSError as error:
+                self.stdout.write(self.style.ERROR(
+                    f'Рецепт {recipe.id}: {error}'))
+                continue
+            save_variants(recipe.id, recipe.image.name, variants)
+            self.stdout.write(f'Рецепт {recipe.id}: копии созданы')
+        self.stdout.write(self.style.SUCCESS('Копии картинок созданы'))
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+ENDPOINTS = [
+    'recipes/?limit=6',
+    'recipes/?limit=6&tags={tag}',
+    'recipes/?limit=6&author={author}',
+    'recipes/?limit=6&is_favorited=1',
+    'recipes/?limit=6&is_in_shopping_cart=1',
+    'recipes/?limit=6&search={word}',
+    'recipes/{recipe}/',
+    'recipes/download_shopping_cart/',
+    'tags/',
+    'ingredients/',
+    'users/?limit=6',
+    'users/subscriptions/?limit=6&recipes_limit=3',
+]
+
+
+class Command(BaseCommand):
+    """Команда для вывода планов запросов основных адресов API.
+
+    Запросы выполняются от имени пользователя к текущей базе данных,
+    для каждого SELECT выводится план EXPLAIN.
+    """
+    help = 'Print EXPLAIN plans for the queries of the main API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            help='Почта пользователя, по умолчанию первый пользователь')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user = users.first()
+        recipe = Recipe.objects.order_by('id').first()
+        tag = Tag.objects.order_by('id').first()
+        if user is None or recipe is None or tag is None:
+            raise CommandError('Нужны пользователь, рецепт и тег')
+        values = {
+            'tag': tag.slug,
+            'author': recipe.author_id,
+            'recipe': recipe.id,
+            'word': recipe.name.split()[0],
+        }
+
+        client = APIClient()
+        client.force_authenticate(user)
+        with override_settings(ALLOWED_HOSTS=['*']):
+            for endpoint in ENDPOINTS:
+                url = '/api/' + endpoint.format(**values)
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                    status = response.status_code
+                    if response.streaming:
+                        # Запросы выполняются при чтении ответа.
+                        b''.join(response.streaming_content)
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'GET {url} ({status})'))
+                for query in context.captured_queries:
+                    self.explain(query['sql'])
+
+    def explain(self, sql):
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return
+        self.stdout.write(sql)
+        prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                  else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            for row in cursor.fetchall():
+                self.stdout.write('    ' + ' '.join(map(str, row)))
+        self.stdout.write('')
@@ -0,0 +1,126 @@
+import gzip
+import json
+import tarfile
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from users.models import User
+
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def open_dump(path, mode):
+    """Файл выгрузки, сжатый gzip, если имя заканчивается на .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в формате NDJSON.
+
+    Каждая строка файла - один рецепт вместе с автором, тегами
+    и ингредиентами. Рецепты читаются пачками по id, поэтому расход
+    памяти не зависит от их количества.
+    """
+    help = 'Export recipes to an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', help='Файл выгрузки (.ndjson или .ndjson.gz)')
+        parser.add_argument(
+            '--media',
+            help='Архив tar для картинок рецептов')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном запросе')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        ingredients = {
+            id: [name, unit] for id, name, unit
+            in Ingredient.objects.values_list('id', 'name',
+                                              'measurement_unit')
+        }
+        tags = dict(Tag.objects.values_list('id', 'slug'))
+        authors = {}
+        self.archived = set()
+        archive = (tarfile.open(options['media'], 'w')
+                   if options['media'] else None)
+
+        total = 0
+        last_id = 0
+        try:
+            with open_dump(options['file'], 'w') as file:
+                while True:
+                    recipes = list(
+                        Recipe.objects.filter(id__gt=last_id).order_by('id')
+                        .values('id', 'author_id', 'name', 'image', 'text',
+                                'cooking_time', 'pub_date')[:batch_size])
+                    if not recipes:
+                        break
+                    last_id = recipes[-1]['id']
+                    self.write_batch(file, recipes, ingredients, tags,
+                                     authors, archive)
+                    total += len(recipes)
+                    self.stdout.write(f'  выгружено рецептов: {total}')
+        finally:
+            if archive:
+                archive.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгрузка завершена, рецептов: {total}'))
+
+    def write_batch(self, file, recipes, ingredients, tags, authors,
+                    archive):
+        ids = [recipe['id'] for recipe in recipes]
+        recipe_ingredients = {}
+        for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(recipe_id__in=ids)
+                .order_by('id')
+                .values_list('recipe_id', 'ingredients_id', 'amount')):
+            recipe_ingredients.setdefault(recipe_id, []).append(
+                ingredients[ingredient_id] + [amount])
+        recipe_tags = {}
+        for recipe_id, tag_id in (
+                RecipeTag.objects.filter(recipe_id__in=ids)
+                .order_by('id').values_list('recipe_id', 'tag_id')):
+            recipe_tags.setdefault(recipe_id, []).append(tags[tag_id])
+
+        # Авторов может быть много, поэтому в памяти хранятся
+        # только авторы текущей пачки.
+        needed = {recipe['author_id'] for recipe in recipes}
+        for author_id in set(authors) - needed:
+            del authors[author_id]
+        authors.update(
+            (user['id'], user) for user in User.objects.filter(
+                id__in=needed - set(authors)
+            ).values('id', *AUTHOR_FIELDS))
+
+        for recipe in recipes:
+            author = authors[recipe['author_id']]
+            file.write(json.dumps({
+                'author': {field: author[field] for field in AUTHOR_FIELDS},
+                'name': recipe['name'],
+                'image': recipe['image'],
+                'text': recipe['text'],
+                'cooking_time': recipe['cooking_time'],
+                'pub_date': recipe['pub_date'].isoformat(),
+                'tags': recipe_tags.get(recipe['id'], []),
+                'ingredients': recipe_ingredients.get(recipe['id'], []),
+            }, ensure_ascii=False))
+            file.write('\n')
+            if archive and recipe['image'] not in self.archived:
+                self.add_image(archive, recipe['image'])
+
+    def add_image(self, archive, name):
+        self.archived.add(name)
+        try:
+            info = tarfile.TarInfo(name)
+            info.size = default_storage.size(name)
+            with default_storage.open(name) as image:
+                archive.addfile(info, image)
+        except OSError as error:
+            self.stdout.write(self.style.ERROR(
+                f'Картинка {name} не добавлена: {error}'))
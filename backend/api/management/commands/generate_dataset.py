@@ -0,0 +1,291 @@
+import io
+import itertools
+import random
+import time
+from bisect import bisect
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.db.models import Max, Value
+from django.db.models.functions import Cast, StrIndex, Substr
+from django.utils import timezone
+from PIL import Image
+
+from core.counters import COUNTERS, recount
+from core.feed import rebuild_timelines
+from core.tag_mask import get_mask
+from core.utils import bulk_create_recipes
+from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, ShoppingListItem, Tag)
+from users.models import Follow, User
+
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Петр', 'Ольга', 'Сергей', 'Елена',
+               'Дмитрий', 'Наталья', 'Алексей', 'Татьяна', 'Андрей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+              'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Федоров')
+DISHES = ('суп', 'салат', 'пирог', 'рагу', 'омлет', 'плов', 'запеканка',
+          'каша', 'котлеты', 'блины', 'паста', 'жаркое', 'борщ', 'сырники')
+ADJECTIVES = ('домашний', 'быстрый', 'летний', 'пряный', 'нежный',
+              'бабушкин', 'острый', 'сытный', 'легкий', 'праздничный')
+SENTENCES = (
+    'Нарежьте все ингредиенты небольшими кусочками.',
+    'Разогрейте сковороду и обжарьте до золотистого цвета.',
+    'Добавьте специи по вкусу и перемешайте.',
+    'Готовьте на медленном огне, периодически помешивая.',
+    'Выложите на блюдо и подавайте горячим.',
+    'Оставьте настояться на несколько минут перед подачей.',
+)
+
+
+class Sampler:
+    """Выбор элементов с вероятностью по степенному закону:
+    элемент с рангом r выбирается с весом 1 / r ** exponent.
+    """
+
+    def __init__(self, items, exponent, rand):
+        self.items = list(items)
+        rand.shuffle(self.items)
+        self.weights = list(itertools.accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+        self.rand = rand
+
+    def choice(self):
+        point = self.rand.random() * self.weights[-1]
+        return self.items[bisect(self.weights, point)]
+
+    def sample(self, count, exclude=None):
+        """count разных элементов, кроме exclude."""
+        count = min(count, len(self.items) - (exclude is not None))
+        result = set()
+        while len(result) < count:
+            item = self.choice()
+            if item != exclude:
+                result.add(item)
+        return result
+
+
+class Command(BaseCommand):
+    """Команда для заполнения базы данных случайными данными.
+
+    Создает пользователей, подписки, рецепты с ингредиентами и тегами,
+    избранное и списки покупок. Популярность авторов, рецептов
+    и ингредиентов распределена по степенному закону. При одинаковом
+    seed и пустой базе данных результат одинаковый. Справочники
+    ингредиентов и тегов должны быть загружены заранее.
+    """
+    help = 'Generate a synthetic dataset for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Количество пользователей')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Количество рецептов')
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--favorites', type=float, default=20,
+                            help='Среднее число рецептов в избранном')
+        parser.add_argument('--cart', type=float, default=3,
+                            help='Среднее число рецептов в списке покупок')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Период публикации рецептов в днях')
+        parser.add_argument('--password', default='password',
+                            help='Пароль всех пользователей')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество строк в одном запросе')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель степенного закона популярности')
+
+    def handle(self, *args, **options):
+        self.rand = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.exponent = options['exponent']
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+        self.tag_bits = dict(Tag.objects.order_by('id').values_list(
+            'id', 'bit'))
+        tags = list(self.tag_bits)
+        if not ingredients or not tags:
+            raise CommandError(
+                'Справочники пусты, выполните import_ingredients')
+        self.ingredients = Sampler(ingredients, self.exponent, self.rand)
+        self.tags = Sampler(tags, self.exponent, self.rand)
+
+        started = time.monotonic()
+        users = self.create_users(options['users'], options['password'])
+        self.authors = Sampler(users, self.exponent, self.rand)
+        self.create_follows(users, options['follows'])
+        recipes = self.create_recipes(options['recipes'], options['days'])
+        popular = Sampler(recipes, self.exponent, self.rand)
+        self.create_user_recipes(Favorites, 'Избранное', users, popular,
+                                 options['favorites'])
+        carts = self.create_user_recipes(ShoppingCart, 'Списки покупок',
+                                         users, popular, options['cart'])
+        self.create_shopping_lists(carts)
+        # Подписки, избранное и списки покупок созданы только для новых
+        # пользователей и рецептов, поэтому пересчитываются только они.
+        with transaction.atomic():
+            for model, ids in (('users.User', users),
+                               ('recipes.Recipe', recipes)):
+                counters = [counter for counter in COUNTERS
+                            if counter[0] == model]
+                for start in range(0, len(ids), self.batch_size):
+                    recount(counters, ids[start:start + self.batch_size])
+        self.stdout.write('  Счетчики пересчитаны')
+        with transaction.atomic():
+            self.mark_not_fanned_out(users)
+            entries = rebuild_timelines(users)
+        self.stdout.write(f'  Ленты подписок: {entries}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.monotonic() - started:.1f} с'))
+
+    def count(self, average):
+        """Случайное количество со средним average и длинным хвостом."""
+        if average <= 0:
+            return 0
+        return int(self.rand.expovariate(1 / average))
+
+    def save(self, model, objects, label):
+        """Запись объектов пачками с выводом прогресса."""
+        objects = iter(objects)
+        saved = 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            saved += len(batch)
+            self.stdout.write(f'  {label}: {saved}')
+            yield from batch
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        start = self.get_free_number()
+        users = (
+            User(username=f'user{number}', email=f'user{number}@example.com',
+                 first_name=self.rand.choice(FIRST_NAMES),
+                 last_name=self.rand.choice(LAST_NAMES), password=password)
+            for number in range(start, start + count))
+        return [user.id for user in self.save(User, users, 'Пользователи')]
+
+    def get_free_number(self):
+        """Номер, начиная с которого имена user{n} и почты
+        user{n}@example.com не заняты.
+        """
+        numbers = [
+            User.objects.filter(username__regex=r'^user[0-9]+$').aggregate(
+                number=Max(Cast(Substr('username', 5),
+                                models.BigIntegerField())))['number'],
+            User.objects.filter(
+                email__regex=r'^user[0-9]+@example\.com$').aggregate(
+                number=Max(Cast(
+                    Substr('email', 5, StrIndex('email', Value('@')) - 5),
+                    models.BigIntegerField())))['number'],
+        ]
+        return max((number for number in numbers if number is not None),
+                   default=-1) + 1
+
+    def create_follows(self, users, average):
+        def follows():
+            for user in users:
+                for author in self.authors.sample(self.count(average),
+                                                  exclude=user):
+                    yield Follow(user_id=user, author_id=author)
+
+        for _ in self.save(Follow, follows(), 'Подписки'):
+            pass
+
+    def create_recipes(self, count, days):
+        image = self.create_image()
+        now = timezone.now()
+        seconds = days * 24 * 60 * 60
+        recipes = []
+        for start in range(0, count, self.batch_size):
+            batch = []
+            for _ in range(min(self.batch_size, count - start)):
+                name = (f'{self.rand.choice(ADJECTIVES).capitalize()} '
+                        f'{self.rand.choice(DISHES)}')
+                recipe = Recipe(
+                    author_id=self.authors.choice(), name=name, image=image,
+                    text=' '.join(self.rand.sample(
+                        SENTENCES, self.rand.randint(2, len(SENTENCES)))),
+                    cooking_time=self.rand.randint(5, 180),
+                    pub_date=now - timedelta(
+                        seconds=self.rand.randint(0, seconds)))
+                recipe.tags_id = self.tags.sample(self.rand.randint(1, 3))
+                recipe.tags_mask = get_mask(
+                    self.tag_bits[id] for id in recipe.tags_id)
+                batch.append(recipe)
+            with transaction.atomic():
+                bulk_create_recipes(batch)
+                RecipeIngredient.objects.bulk_create(
+                    RecipeIngredient(recipe_id=recipe.id, ingredients_id=id,
+                                     amount=self.rand.randint(1, 50) * 10)
+                    for recipe in batch
+                    for id in self.ingredients.sample(
+                        self.rand.randint(3, 12)))
+                RecipeTag.objects.bulk_create(
+                    RecipeTag(recipe_id=recipe.id, tag_id=id)
+                    for recipe in batch for id in recipe.tags_id)
+            recipes.extend(recipe.id for recipe in batch)
+            self.stdout.write(f'  Рецепты: {len(recipes)}/{count}')
+        return recipes
+
+    def mark_not_fanned_out(self, users):
+        """Рецепты авторов сверх порога подписчиков не записываются
+        в ленты, как в core.feed.fan_out.
+        """
+        for start in range(0, len(users), self.batch_size):
+            Recipe.objects.filter(
+                author_id__in=users[start:start + self.batch_size],
+                author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+            ).update(fanned_out=False)
+
+    def create_image(self):
+        """Общая картинка для всех рецептов."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), (230, 150, 60)).save(buffer, 'JPEG')
+        return default_storage.save('recipes/images/generated.jpg',
+                                    ContentFile(buffer.getvalue()))
+
+    def create_user_recipes(self, model, label, users, recipes, average):
+        """Избранное или список покупок, возвращает пользователей,
+        у которых есть рецепты.
+        """
+        filled = []
+
+        def objects():
+            for user in users:
+                chosen = recipes.sample(self.count(average))
+                if chosen:
+                    filled.append(user)
+                for recipe in chosen:
+                    yield model(user_id=user, recipe_id=recipe)
+
+        for _ in self.save(model, objects(), label):
+            pass
+        return filled
+
+    def create_shopping_lists(self, users):
+        """Суммы ингредиентов списков покупок, как в миграции 0002."""
+        for start in range(0, len(users), self.batch_size):
+            items = RecipeIngredient.objects.filter(
+                recipe__shoppingcart__user__in=users[
+                    start:start + self.batch_size]).values(
+                'recipe__shoppingcart__user', 'ingredients').annotate(
+                    total_amount=models.Sum('amount'))
+            with transaction.atomic():
+                ShoppingListItem.objects.bulk_create(
+                    (ShoppingListItem(
+                        user_id=item['recipe__shoppingcart__user'],
+                        ingredient_id=item['ingredients'],
+                        amount=item['total_amount'])
+                     for item in items.iterator()),
+                    batch_size=self.batch_size)
+        self.stdout.write(f'  Суммы списков покупок: {len(users)}')
@@ -1,55 +1,171 @@
 import csv
+import json
 import os
+import re
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from core.catalog import bump_catalog_version
+from core.tag_mask import assign_tag_bits
 from recipes.models import Ingredient, Tag
 
+READ_SIZE = 64 * 1024
+
+
+def normalize(value):
+    return re.sub(r'\s+', ' ', str(value)).strip()
+
+
+def iter_json_array(file):
+    """Построчный разбор json массива без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается json массив')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('Неверный json файл')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_rows(path, fields):
+    """Строки файла csv или json в виде кортежей значений fields."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if path.endswith('.json'):
+            for item in iter_json_array(file):
+                yield tuple(normalize(item[field]) for field in fields)
+        else:
+            for row in csv.reader(file):
+                if row:
+                    yield tuple(normalize(value)
+                                for value in row[:len(fields)])
+
 
 class Command(BaseCommand):
-    """Команда для импорта ингредиентов и тегов из csv файла."""
-    help = 'Import ingredients from csv file'
+    """Команда для импорта ингредиентов и тегов из csv или json файла."""
+    help = 'Import ingredients and tags from csv or json files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients', default=os.path.join('data', 'ingredients.csv'),
+            help='Файл с ингредиентами (csv или json)')
+        parser.add_argument(
+            '--tags', default=os.path.join('data', 'tags.csv'),
+            help='Файл с тегами (csv или json), пустая строка - пропустить')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном запросе')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Проверить файлы без записи в базу данных')
 
     def handle(self, *args, **options):
-        file = os.path.join('data/ingredients.csv')
-        with open(file, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                ingredient, created = Ingredient.objects.update_or_create(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                ingredient.save()
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ингредиент "{ingredient.name}" добавлен'
-                    ))
-                else:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Ингредиент "{ingredient.name}" уже существует'
-                    ))
-        self.stdout.write(self.style.SUCCESS(
-            'Импорт завершен'
-        ))
-
-        file = os.path.join('data/tags.csv')
-        with open(file, newline='', encoding='utf-8') as csvfile:
-            reader = csv.reader(csvfile)
-            for row in reader:
-                tag, created = Tag.objects.update_or_create(
-                    name=row[0],
-                    color=row[1],
-                    slug=row[2]
-                )
-                tag.save()
-                if created:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Тег "{tag.name}" добавлен'
-                    ))
-                else:
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Тег "{tag.name}" уже существует'
-                    ))
-        self.stdout.write(self.style.SUCCESS(
-            'Импорт завершен'
-        ))
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+
+        with transaction.atomic():
+            ingredients_before = Ingredient.objects.count()
+            self.import_rows(
+                options['ingredients'], ('name', 'measurement_unit'),
+                [(0, 1)],
+                lambda batch: Ingredient.objects.bulk_create(
+                    (Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in batch),
+                    ignore_conflicts=True))
+            self.stdout.write(self.style.SUCCESS(
+                'Добавлено ингредиентов: '
+                f'{Ingredient.objects.count() - ingredients_before}'))
+
+            if options['tags']:
+                # Тег обновляется по слагу, но пара название и цвет
+                # тоже уникальна, поэтому занятые другими тегами пары
+                # пропускаются до записи.
+                self.import_rows(
+                    options['tags'], ('name', 'color', 'slug'),
+                    [(2,), (0, 1)],
+                    lambda batch: Tag.objects.bulk_create(
+                        (Tag(name=name, color=color, slug=slug)
+                         for name, color, slug in batch),
+                        update_conflicts=True, unique_fields=['slug'],
+                        update_fields=['name', 'color']),
+                    Tag.objects.values_list('name', 'color', 'slug'))
+                assign_tag_bits()
+
+            if self.dry_run:
+                transaction.set_rollback(True)
+                self.stdout.write(self.style.WARNING(
+                    'Пробный запуск, изменения не сохранены'))
+            else:
+                transaction.on_commit(bump_catalog_version)
+        self.stdout.write(self.style.SUCCESS('Импорт завершен'))
+
+    def import_rows(self, path, fields, unique, save, existing=()):
+        """Загрузка строк файла пачками без нарушения уникальности.
+
+        unique - номера полей уникальных ключей, первый ключ определяет
+        строку. Повторы строки пропускаются, как и строки, другой ключ
+        которых уже занят другой строкой файла или existing.
+        """
+        owners = [{} for _ in unique]
+        for row in existing:
+            for keys, indexes in zip(owners, unique):
+                keys[self.get_key(row, indexes)] = self.get_key(
+                    row, unique[0])
+        seen = set()
+        batch = []
+        total = 0
+        skipped = 0
+        for row in iter_rows(path, fields):
+            if len(row) != len(fields) or not all(row):
+                skipped += 1
+                continue
+            key = self.get_key(row, unique[0])
+            if key in seen:
+                skipped += 1
+                continue
+            owner = self.get_owner(owners, unique, row, key)
+            if owner is not None:
+                skipped += 1
+                self.stdout.write(self.style.ERROR(
+                    f'Строка {", ".join(row)} пропущена: '
+                    f'конфликт с {", ".join(owner)}'))
+                continue
+            seen.add(key)
+            for keys, indexes in zip(owners, unique):
+                keys[self.get_key(row, indexes)] = key
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                total += self.save_batch(save, batch)
+                batch = []
+        if batch:
+            total += self.save_batch(save, batch)
+        self.stdout.write(
+            f'{path}: обработано {total}, пропущено {skipped}')
+
+    def get_key(self, row, indexes):
+        return tuple(row[index] for index in indexes)
+
+    def get_owner(self, owners, unique, row, key):
+        """Другая строка, которой уже принадлежит один из ключей row."""
+        for keys, indexes in zip(owners, unique):
+            owner = keys.get(self.get_key(row, indexes), key)
+            if owner != key:
+                return owner
+        return None
+
+    def save_batch(self, save, batch):
+        save(batch)
+        self.stdout.write(f'  записано строк: {len(batch)}')
+        return len(batch)
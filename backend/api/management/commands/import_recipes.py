@@ -0,0 +1,184 @@
+import json
+import os
+import tarfile
+from collections import Counter
+from datetime import datetime
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.management.commands.export_recipes import AUTHOR_FIELDS, open_dump
+from core.counters import change_counter
+from core.tag_mask import get_mask
+from core.utils import bulk_create_recipes
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+from users.models import User
+
+IMAGE_DIRECTORY = 'recipes/images/'
+AUTHORS_CACHE_SIZE = 10000
+AMOUNT_FIELD = RecipeIngredient._meta.get_field('amount')
+COOKING_TIME_FIELD = Recipe._meta.get_field('cooking_time')
+
+
+class Command(BaseCommand):
+    """Команда для загрузки рецептов из файла NDJSON.
+
+    Файл читается построчно, рецепты записываются пачками через
+    bulk_create. Теги и ингредиенты должны уже быть в справочниках,
+    отсутствующие авторы создаются без пароля.
+    """
+    help = 'Import recipes from an NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', help='Файл выгрузки (.ndjson или .ndjson.gz)')
+        parser.add_argument(
+            '--media',
+            help='Архив tar с картинками рецептов')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной транзакции')
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                'База данных не возвращает id при bulk_create')
+        self.images = (self.extract_images(options['media'])
+                       if options['media'] else {})
+        self.ingredients = {
+            (name, unit): id for id, name, unit
+            in Ingredient.objects.values_list('id', 'name',
+                                              'measurement_unit')
+        }
+        self.tags = {slug: (id, bit) for slug, id, bit
+                     in Tag.objects.values_list('slug', 'id', 'bit')}
+        self.authors = {}
+        self.total = self.skipped = 0
+
+        batch = []
+        with open_dump(options['file'], 'r') as file:
+            for number, line in enumerate(file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(self.parse(json.loads(line)))
+                except (ValueError, KeyError, TypeError,
+                        ValidationError) as error:
+                    self.skipped += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'Строка {number} пропущена: {error!r}'))
+                    continue
+                if len(batch) >= options['batch_size']:
+                    self.save_batch(batch)
+                    batch = []
+        if batch:
+            self.save_batch(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {self.total}, пропущено: {self.skipped}'))
+        if self.total:
+            self.stdout.write(
+                'Для копий картинок выполните create_image_variants')
+
+    def extract_images(self, path):
+        """Картинки из архива в хранилище медиафайлов.
+
+        Возвращает новые имена файлов, если имя из архива уже занято.
+        """
+        images = {}
+        with tarfile.open(path, 'r') as archive:
+            for member in archive:
+                name = os.path.normpath(member.name)
+                if not member.isfile() or not name.startswith(
+                        IMAGE_DIRECTORY):
+                    continue
+                images[member.name] = default_storage.save(
+                    name, archive.extractfile(member))
+        self.stdout.write(f'Извлечено картинок: {len(images)}')
+        return images
+
+    def parse(self, data):
+        """Рецепт из строки выгрузки с id ингредиентов и тегов."""
+        ingredients = {}
+        for name, unit, amount in data['ingredients']:
+            id = self.ingredients.get((name, unit))
+            if id is None:
+                raise ValueError(f'Нет ингредиента {name}, {unit}')
+            ingredients[id] = ingredients.get(id, 0) + int(amount)
+        # Ограничения модели, которые bulk_create не проверяет.
+        for amount in ingredients.values():
+            AMOUNT_FIELD.run_validators(amount)
+        cooking_time = int(data['cooking_time'])
+        COOKING_TIME_FIELD.run_validators(cooking_time)
+        tags = {}
+        for slug in data['tags']:
+            if slug not in self.tags:
+                raise ValueError(f'Нет тега {slug}')
+            id, bit = self.tags[slug]
+            tags[id] = bit
+        return {
+            'author': {field: data['author'][field]
+                       for field in AUTHOR_FIELDS},
+            'recipe': Recipe(
+                name=data['name'],
+                image=self.images.get(data['image'], data['image']),
+                text=data['text'],
+                cooking_time=cooking_time,
+                pub_date=datetime.fromisoformat(data['pub_date']),
+                tags_mask=get_mask(tags.values())),
+            'ingredients': ingredients,
+            'tags': tags,
+        }
+
+    def get_authors(self, batch):
+        """id авторов пачки, отсутствующие авторы создаются."""
+        if len(self.authors) > AUTHORS_CACHE_SIZE:
+            self.authors.clear()
+        emails = {item['author']['email'] for item in batch} - set(
+            self.authors)
+        self.authors.update(User.objects.filter(
+            email__in=emails).values_list('email', 'id'))
+        missing = {}
+        for item in batch:
+            author = item['author']
+            if author['email'] not in self.authors:
+                missing[author['email']] = User(
+                    password=make_password(None), **author)
+        if missing:
+            User.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            self.authors.update(User.objects.filter(
+                email__in=missing).values_list('email', 'id'))
+
+    @transaction.atomic
+    def save_batch(self, batch):
+        self.get_authors(batch)
+        items = []
+        for item in batch:
+            author_id = self.authors.get(item['author']['email'])
+            if author_id is None:
+                self.skipped += 1
+                self.stdout.write(self.style.ERROR(
+                    f'Рецепт {item["recipe"].name} пропущен: имя '
+                    f'пользователя {item["author"]["username"]} занято'))
+                continue
+            item['recipe'].author_id = author_id
+            items.append(item)
+        if not items:
+            return
+
+        bulk_create_recipes([item['recipe'] for item in items])
+
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=item['recipe'], ingredients_id=id,
+                             amount=amount)
+            for item in items for id, amount in item['ingredients'].items())
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=item['recipe'], tag_id=id)
+            for item in items for id in item['tags'])
+        for author_id, count in Counter(
+                item['recipe'].author_id for item in items).items():
+            change_counter(User, author_id, 'recipes_count', count)
+        self.total += len(items)
+        self.stdout.write(f'  загружено рецептов: {self.total}')
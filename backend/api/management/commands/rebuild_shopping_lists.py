@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.shopping_list import get_expected_shopping_lists
+from recipes.models import ShoppingListItem
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Команда для проверки и пересчета списков покупок."""
+    help = 'Verify and rebuild shopping list aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить списки покупок, не исправляя их')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, можно указать несколько раз')
+
+    def handle(self, *args, **options):
+        users_id = options['users']
+        expected = get_expected_shopping_lists(users_id)
+        items = ShoppingListItem.objects.all()
+        if users_id is not None:
+            items = items.filter(user_id__in=users_id)
+        actual = {
+            (item.user_id, item.ingredient_id): item
+            for item in items.iterator()
+        }
+
+        missing = [
+            ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                             amount=amount)
+            for (user_id, ingredient_id), amount in expected.items()
+            if (user_id, ingredient_id) not in actual
+        ]
+        extra = [item.id for key, item in actual.items()
+                 if key not in expected]
+        wrong = []
+        for key, item in actual.items():
+            if key in expected and item.amount != expected[key]:
+                item.amount = expected[key]
+                wrong.append(item)
+
+        self.stdout.write(
+            f'Нет в списках: {len(missing)}, лишних: {len(extra)}, '
+            f'с неверным количеством: {len(wrong)}')
+        if not (missing or extra or wrong):
+            self.stdout.write(self.style.SUCCESS('Списки покупок верны'))
+            return
+        if options['check']:
+            raise CommandError('Списки покупок расходятся')
+
+        with transaction.atomic():
+            for start in range(0, len(extra), BATCH_SIZE):
+                ShoppingListItem.objects.filter(
+                    id__in=extra[start:start + BATCH_SIZE]).delete()
+            ShoppingListItem.objects.bulk_update(wrong, ['amount'],
+                                                 batch_size=BATCH_SIZE)
+            ShoppingListItem.objects.bulk_create(missing,
+                                                 batch_size=BATCH_SIZE)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны'))
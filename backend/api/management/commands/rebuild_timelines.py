@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.feed import rebuild_timelines, trim_timelines
+
+
+class Command(BaseCommand):
+    """Команда для пересборки и обрезки лент подписок."""
+    help = 'Rebuild or trim subscription feed timelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trim', action='store_true',
+            help='Только удалить записи сверх FEED_TIMELINE_LENGTH')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='id пользователя, можно указать несколько раз')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['trim']:
+                deleted = trim_timelines(options['users'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'Удалено записей лент: {deleted}'))
+                return
+            created = rebuild_timelines(options['users'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {created}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.counters import recount
+
+
+class Command(BaseCommand):
+    """Команда для проверки и пересчета счетчиков рецептов
+    и пользователей.
+    """
+    help = 'Verify and repair denormalized counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только проверить счетчики, не исправляя их')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            result = recount(check=options['check'])
+        for counter, wrong in result.items():
+            self.stdout.write(f'{counter}: неверных значений {wrong}')
+        if not any(result.values()):
+            self.stdout.write(self.style.SUCCESS('Счетчики верны'))
+        elif options['check']:
+            raise CommandError('Счетчики расходятся с данными')
+        else:
+            self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    """Команда для копирования основной базы SQLite в файлы реплик.
+
+    Заменяет репликацию сервера при локальной проверке чтения
+    из реплик, реплики PostgreSQL обновляет сам сервер.
+    """
+    help = 'Copy the primary SQLite database into replica files'
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError('Реплики не заданы в DATABASE_REPLICAS')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Реплики копируются только для SQLite')
+        primary.ensure_connection()
+        for alias in settings.REPLICA_DATABASES:
+            connections[alias].close()
+            name = settings.DATABASES[alias]['NAME']
+            replica = sqlite3.connect(name)
+            try:
+                primary.connection.backup(replica)
+            finally:
+                replica.close()
+            self.stdout.write(f'{alias}: {name}')
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
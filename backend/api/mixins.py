@@ -0,0 +1,248 @@
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import InterfaceError, OperationalError
+from django.http import Http404, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import permissions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from core.authentication import aauthenticate
+from core.catalog import get_catalog_version
+from core.routers import (get_replica, is_pinned, mark_unavailable,
+                          pin_to_primary, read_database)
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы читают из реплики, если они настроены.
+
+    Пользователь читает из основной базы REPLICA_PIN_SECONDS секунд
+    после успешного изменения данных, чтобы сразу видеть свои рецепты,
+    избранное и подписки. Аутентификация выполняется до выбора реплики
+    и всегда читает токен из основной базы.
+    """
+    read_database_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (request.method in permissions.SAFE_METHODS
+                and settings.REPLICA_DATABASES
+                and not is_pinned(request)):
+            replica = get_replica()
+            if replica is not None:
+                self.read_database_token = read_database.set(replica)
+
+    def handle_exception(self, exc):
+        # Ошибки сервера DRF пробрасывает дальше без finalize_response.
+        replica = self.reset_read_database()
+        if replica is not None and isinstance(exc, (OperationalError,
+                                                    InterfaceError)):
+            mark_unavailable(replica)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        self.reset_read_database()
+        if (request.method not in permissions.SAFE_METHODS
+                and settings.REPLICA_DATABASES
+                and status.is_success(response.status_code)
+                and request.user.is_authenticated):
+            pin_to_primary(request, response)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def reset_read_database(self):
+        """Возвращает чтение в основную базу и реплику запроса."""
+        if self.read_database_token is None:
+            return None
+        replica = read_database.get()
+        read_database.reset(self.read_database_token)
+        self.read_database_token = None
+        return replica
+
+
+class AsyncReadMixin:
+    """Чтение в асинхронных представлениях в режиме ASGI.
+
+    При ASYNC_READS запросы GET и HEAD к действиям async_actions
+    выполняются методами a<действие> в цикле событий, данные читаются
+    асинхронным ORM Django. Остальные методы того же адреса выполняются
+    синхронным представлением DRF через sync_to_async.
+    """
+    async_actions = ('list', 'retrieve')
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if (not settings.ASYNC_READS
+                or actions.get('get') not in cls.async_actions):
+            return view
+        actions.setdefault('head', actions['get'])
+        sync_view = sync_to_async(view)
+
+        async def async_view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_view(request, *args, **kwargs)
+            self = cls(**initkwargs)
+            self.action_map = actions
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        # csrf_exempt в Django 4.2 не сохраняет асинхронность функции.
+        async_view.csrf_exempt = True
+        async_view.cls = cls
+        async_view.initkwargs = initkwargs
+        async_view.actions = actions
+        return async_view
+
+    async def adispatch(self, request, *args, **kwargs):
+        """dispatch DRF, аутентификация выполняется асинхронно."""
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            await aauthenticate(request)
+            self.initial(request, *args, **kwargs)
+            if request.method.lower() not in self.http_method_names:
+                self.http_method_not_allowed(request, *args, **kwargs)
+            handler = getattr(self, f'a{self.action}')
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        self.response = self.finalize_response(request, response,
+                                               *args, **kwargs)
+        return self.response
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        page = await self.apaginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                await self.aserialize(page, many=True))
+        return Response(await self.aserialize(
+            [item async for item in queryset], many=True))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return Response(await self.aserialize(await self.aget_object()))
+
+    async def afilter_queryset(self, queryset):
+        """filter_queryset, фильтры не должны обращаться к базе данных."""
+        return self.filter_queryset(queryset)
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(
+            queryset, self.request, view=self)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = await queryset.aget(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError,
+                ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    async def aserialize(self, instance, many=False):
+        """Данные сериализатора, загрузчики заполняются заранее
+        методом apreload.
+        """
+        serializer = self.get_serializer(instance, many=many)
+        if hasattr(serializer, 'apreload'):
+            await serializer.apreload(instance if many else [instance])
+        return serializer.data
+
+
+class CatalogCacheMixin:
+    """Кэширование ответов справочников.
+
+    Ответ сериализуется один раз для каждой версии справочников
+    и каждого набора параметров запроса, повторные запросы с
+    If-None-Match или If-Modified-Since получают 304. Ответы хранятся
+    в кэше catalog в памяти процесса, версия справочников - в общем кэше.
+    Запросы с параметрами uncached_params, например автодополнение
+    с индексом в памяти, не кэшируются.
+    """
+    uncached_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(super().retrieve, request,
+                                     *args, **kwargs)
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.acatalog_response(super().alist, request,
+                                            *args, **kwargs)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.acatalog_response(super().aretrieve, request,
+                                            *args, **kwargs)
+
+    def catalog_response(self, handler, request, *args, **kwargs):
+        if (request.accepted_renderer.format != 'json'
+                or not self.is_cached(request)):
+            return handler(request, *args, **kwargs)
+
+        etag, last_modified, key = self.get_catalog_key(request)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            body = caches['catalog'].get(key)
+            if body is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                body = self.cache_body(key, response)
+            response = HttpResponse(body, content_type='application/json')
+        return self.patch_catalog_headers(response, etag, last_modified)
+
+    async def acatalog_response(self, handler, request, *args, **kwargs):
+        if (request.accepted_renderer.format != 'json'
+                or not self.is_cached(request)):
+            return await handler(request, *args, **kwargs)
+
+        etag, last_modified, key = self.get_catalog_key(request)
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            body = caches['catalog'].get(key)
+            if body is None:
+                response = await handler(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                body = self.cache_body(key, response)
+            response = HttpResponse(body, content_type='application/json')
+        return self.patch_catalog_headers(response, etag, last_modified)
+
+    def is_cached(self, request):
+        return not any(request.query_params.get(param)
+                       for param in self.uncached_params)
+
+    def get_catalog_key(self, request):
+        """ETag, время изменения и ключ кэша ответа."""
+        version, modified = get_catalog_version()
+        path = md5(request.get_full_path().encode()).hexdigest()
+        return (f'"{version}-{path}"', int(modified),
+                f'catalog:{version}:{path}')
+
+    def cache_body(self, key, response):
+        body = JSONRenderer().render(response.data)
+        caches['catalog'].set(key, body)
+        return body
+
+    def patch_catalog_headers(self, response, etag, last_modified):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
@@ -1,5 +1,136 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from core.feed import get_feed
 
 
 class PageLimitNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset для асинхронных представлений."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Количество задано заранее, Paginator не выполняет запрос.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)))
+        self.page.object_list = [item async for item in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+
+class RecipePagination(PageLimitNumberPagination):
+    """Постраничный вывод рецептов.
+
+    По умолчанию используются номера страниц. С параметром cursor
+    страницы строятся по ключу (pub_date, id): запрос каждой страницы
+    не зависит от ее глубины и не считает общее количество рецептов.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        queryset, page_size = self.get_cursor_queryset(queryset, request)
+        return self.get_cursor_page(list(queryset), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return await super().apaginate_queryset(queryset, request, view)
+        queryset, page_size = self.get_cursor_queryset(queryset, request)
+        return self.get_cursor_page(
+            [recipe async for recipe in queryset], page_size)
+
+    def get_cursor_queryset(self, queryset, request):
+        """Рецепты страницы после курсора и еще один для проверки,
+        есть ли следующая страница.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-pub_date', '-id')
+        cursor = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        if cursor is not None:
+            pub_date, id = cursor
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=id))
+        return queryset[:page_size + 1], page_size
+
+    def get_cursor_page(self, results, page_size):
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_cursor = self.encode_cursor(last.pub_date, last.id)
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def get_next_cursor_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param, self.next_cursor)
+
+    def encode_cursor(self, pub_date, id):
+        return urlsafe_b64encode(
+            json.dumps([pub_date.isoformat(), id]).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, id = json.loads(urlsafe_b64decode(cursor.encode()))
+            pub_date = parse_datetime(pub_date)
+            id = int(id)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, id
+
+
+class FeedPagination(RecipePagination):
+    """Лента подписок, всегда по курсору."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param))
+        keys = get_feed(request.user, cursor, page_size + 1)
+        self.next_cursor = None
+        if len(keys) > page_size:
+            keys = keys[:page_size]
+            self.next_cursor = self.encode_cursor(*keys[-1])
+        recipes = queryset.in_bulk([id for _, id in keys])
+        return [recipes[id] for _, id in keys if id in recipes]
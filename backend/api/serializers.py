@@ -1,12 +1,23 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
+from core.counters import change_counter
+from core.feed import fan_out
 from core.fields import Base64ImageField
+from core.images import get_image_variants, schedule_image_variants
+from core.loaders import (LoaderListSerializer, RecipeViewerState,
+                          SubscriptionLoader, get_loader)
+from core.uploads import create_upload, delete_used_upload
 from core.utils import create_update_ingredients, create_update_tags
-from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                            RecipeTag, ShoppingCart, Tag)
+from recipes.models import (Favorites, ImageUpload, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
 from users.serializers import CustomUserSerializer
 
+User = get_user_model()
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для тегов."""
@@ -38,9 +49,8 @@ class IngredientGetSerializer(serializers.ModelSerializer):
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и изменения рецептов."""
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True)
+    # Теги читаются одним запросом в validate_tags.
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientSerializer(source='recipe_ingredients', many=True)
     image = Base64ImageField()
 
@@ -56,7 +66,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         if len(value) != len(set(value)):
             raise serializers.ValidationError(
                 'Теги не должны повторяться!!')
-        return value
+        tags = Tag.objects.in_bulk(value)
+        missing = set(value) - set(tags)
+        if missing:
+            raise serializers.ValidationError(
+                'Тегов с id '
+                f'{", ".join(map(str, sorted(missing)))} нет в базе данных!!')
+        return [tags[id] for id in value]
 
     def validate_ingredients(self, value):
         ingredients_id_list = []
@@ -68,20 +84,22 @@ class RecipeSerializer(serializers.ModelSerializer):
             id = ingredient.get('ingredients').get('id')
             amount = ingredient.get('amount')
             ingredients_id_list.append(id)
-            # if not Ingredient.objects.filter(id=id).exists():
-            #     raise serializers.ValidationError(
-            #         f'Ингредиента с id {id} нет в базе данных!!')
 
             if amount <= 0:
                 raise serializers.ValidationError(
                     'Количество ингредиента должно быть больше нуля')
-        if not Ingredient.objects.filter(id__in=ingredients_id_list).exists():
-            raise serializers.ValidationError(
-                'Ингредиента нет в базе данных!!')
 
         if len(ingredients_id_list) != len(set(ingredients_id_list)):
             raise serializers.ValidationError(
                 'Ингредиенты не должны повторяться!!')
+
+        missing = set(ingredients_id_list) - set(
+            Ingredient.objects.filter(id__in=ingredients_id_list
+                                      ).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиентов с id '
+                f'{", ".join(map(str, sorted(missing)))} нет в базе данных!!')
         return value
 
     @transaction.atomic
@@ -89,9 +107,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('recipe_ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
+        change_counter(User, recipe.author_id, 'recipes_count')
+        fan_out(recipe)
 
-        create_update_tags(tags, recipe)
-        create_update_ingredients(ingredients, recipe)
+        create_update_tags(tags, recipe, created=True)
+        create_update_ingredients(ingredients, recipe, created=True)
+        schedule_image_variants(recipe)
+        delete_used_upload(validated_data['image'])
         return recipe
 
     @transaction.atomic
@@ -106,22 +128,17 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
 
         super().update(instance, validated_data)
-
-        if 'recipe_ingredients' in validated_data:
-            RecipeIngredient.objects.filter(recipe=instance).delete()
-            create_update_ingredients(ingredients, instance)
-
-        if 'tags' in validated_data:
-            RecipeTag.objects.filter(recipe=instance).delete()
-            create_update_tags(tags, instance)
-
-        instance.save()
+        create_update_ingredients(ingredients, instance)
+        create_update_tags(tags, instance)
+        if 'image' in validated_data:
+            schedule_image_variants(instance)
+            delete_used_upload(validated_data['image'])
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
-        instance.is_favorited = False
-        instance.is_in_shopping_cart = False
+        prefetch_related_objects([instance], 'tags',
+                                 'recipe_ingredients__ingredients')
         return RecipeGetSerializer(instance, context={'request': request}).data
 
 
@@ -131,16 +148,43 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     ingredients = IngredientSerializer(source='recipe_ingredients',
                                        many=True)
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = serializers.SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
-    is_in_shopping_cart = serializers.BooleanField(read_only=True)
-    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
         read_only_fields = ('__all__',)
+        list_serializer_class = LoaderListSerializer
+
+    def preload(self, instances):
+        request = self.context.get('request')
+        get_loader(request, RecipeViewerState).load(
+            recipe.id for recipe in instances)
+        get_loader(request, SubscriptionLoader).load(
+            recipe.author_id for recipe in instances)
+
+    async def apreload(self, instances):
+        request = self.context.get('request')
+        await get_loader(request, RecipeViewerState).aload(
+            recipe.id for recipe in instances)
+        await get_loader(request, SubscriptionLoader).aload(
+            recipe.author_id for recipe in instances)
+
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
+
+    def get_is_favorited(self, obj):
+        return get_loader(self.context.get('request'),
+                          RecipeViewerState).is_favorited(obj)
+
+    def get_is_in_shopping_cart(self, obj):
+        return get_loader(self.context.get('request'),
+                          RecipeViewerState).is_in_shopping_cart(obj)
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
@@ -181,3 +225,32 @@ class FavoriteSerializer(ShoppingCartSerializer):
     class Meta:
         model = Favorites
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """Сериализатор для загрузки картинок по частям."""
+    image = serializers.FileField(write_only=True, required=False)
+    size = serializers.IntegerField(required=False, min_value=1)
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'size', 'offset', 'image')
+        read_only_fields = ('token', 'offset')
+
+    def validate(self, data):
+        image = data.get('image')
+        if image is not None:
+            data['size'] = image.size
+        if not data.get('size'):
+            raise serializers.ValidationError(
+                'Необходимо передать файл или его размер')
+        if data['size'] > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                'Размер картинки не должен превышать '
+                f'{settings.IMAGE_MAX_UPLOAD_SIZE} байт')
+        return data
+
+    def create(self, validated_data):
+        return create_upload(self.context['request'].user,
+                             validated_data['size'],
+                             validated_data.get('image'))
@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from api.views import (ImageUploadViewSet, IngredientViewSet, RecipeViewSet,
+                       TagViewSet, metrics)
 
 router_v1 = DefaultRouter()
 
@@ -9,7 +10,9 @@ router_v1.register('tags', viewset=TagViewSet, basename='tags')
 router_v1.register('ingredients', viewset=IngredientViewSet,
                    basename='ingredients')
 router_v1.register('recipes', viewset=RecipeViewSet, basename='recipes')
+router_v1.register('uploads', viewset=ImageUploadViewSet, basename='uploads')
 
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
     path('', include(router_v1.urls)),
     path('', include('users.urls'))]
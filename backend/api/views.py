@@ -1,22 +1,44 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, OuterRef, Subquery
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import (HttpResponse, HttpResponseForbidden,
+                         StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, viewsets
+from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.filters import RecipeFilter
+from api.mixins import AsyncReadMixin, CatalogCacheMixin, ReplicaReadMixin
+from api.pagination import FeedPagination, RecipePagination
 from api.permissions import IsAutehenticatedOrAuthorOrReadOnly
-from api.serializers import (FavoriteSerializer, IngredientGetSerializer,
-                             RecipeGetSerializer, RecipeSerializer,
-                             ShoppingCartSerializer, TagSerializer)
-from core.utils import create_delete_instance, create_shopping_list
-from recipes.models import Favorites, Ingredient, Recipe, ShoppingCart, Tag
+from api.renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
+from api.serializers import (FavoriteSerializer, ImageUploadSerializer,
+                             IngredientGetSerializer, RecipeGetSerializer,
+                             RecipeSerializer, ShoppingCartSerializer,
+                             TagSerializer)
+from core.counters import change_counter
+from core.ingredient_index import ingredient_index
+from core.metrics import collect
+from core.metrics import render as render_metrics
+from core.shopping_list import (create_pdf, get_shopping_list, stream_csv,
+                                stream_txt)
+from core.tag_mask import tag_bits
+from core.uploads import UploadOverflow, write_chunk
+from core.utils import create_delete_instance
+from recipes.models import (Favorites, ImageUpload, Ingredient, Recipe,
+                            ShoppingCart, Tag)
 
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, AsyncReadMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Получение тегов."""
     permission_classes = [permissions.AllowAny]
     queryset = Tag.objects.all()
@@ -26,21 +48,36 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name']
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, AsyncReadMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Получение ингредиентов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientGetSerializer
     permission_classes = [permissions.AllowAny]
     pagination_class = None
-    filter_backends = [DjangoFilterBackend, ]
-    filterset_class = IngredientFilter
     lookup_url_kwarg = 'id'
+    # Автодополнение отвечает из индекса в памяти процесса.
+    uncached_params = ('name',)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return Response(ingredient_index.search(name))
+
+    async def alist(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return await super().alist(request, *args, **kwargs)
+        return Response(await ingredient_index.asearch(name))
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, AsyncReadMixin,
+                    viewsets.ModelViewSet):
     """Создание, получение и изменение рецептов."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'delete', 'patch']
@@ -48,24 +85,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
     lookup_url_kwarg = 'id'
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeGetSerializer
         return RecipeSerializer
 
     def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'recipe_ingredients__ingredients')
 
-        return Recipe.objects.annotate(
-            is_favorited=Exists(
-                Subquery(Favorites.objects.filter(
-                    user=OuterRef('author'),
-                    recipe_id=OuterRef('pk')))),
-            is_in_shopping_cart=Exists(
-                Subquery(ShoppingCart.objects.filter(
-                    user=OuterRef('author'),
-                    recipe_id=OuterRef('pk')
-                )))).select_related('author'
-                                    ).prefetch_related('tags',
-                                                       'ingredients')
+    async def afilter_queryset(self, queryset):
+        # Выбор тегов в фильтре строится из битов тегов, они читаются
+        # заранее асинхронным ORM.
+        await tag_bits.aget()
+        return self.filter_queryset(queryset)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -73,6 +105,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Ошибки выгрузки списка покупок выдаются в JSON, а не в формате
+        # файла.
+        if (self.action == 'download_shopping_cart'
+                and isinstance(response, Response)
+                and response.status_code >= status.HTTP_400_BAD_REQUEST):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(User, instance.author_id, 'recipes_count', -1)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[permissions.IsAuthenticated],
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Новые рецепты авторов из подписок пользователя."""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'])
     def favorite(self, request, id):
         """Добавление или удаление рецепта из избранного."""
@@ -86,13 +142,79 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                       ShoppingCartSerializer, id)
 
     @action(detail=False, methods=['get'],
-            permission_classes=[permissions.IsAuthenticated])
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=[PlainTextRenderer, CSVRenderer, PDFRenderer])
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        shop_list = create_shopping_list(request)
-
-        response = HttpResponse(shop_list, 'Content-Type: text/plain')
+        """Скачивание списка покупок в формате txt, csv или pdf."""
+        ingredients = get_shopping_list(request.user)
+        renderer = request.accepted_renderer
+
+        if renderer.format == 'pdf':
+            pdf = create_pdf(ingredients)
+            if pdf is None:
+                return Response(
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    data={'detail': 'Сервис занят, попробуйте позже'})
+            response = HttpResponse(pdf, content_type=renderer.media_type)
+        else:
+            stream = (stream_csv if renderer.format == 'csv'
+                      else stream_txt)(ingredients)
+            response = StreamingHttpResponse(
+                stream,
+                content_type=f'{renderer.media_type}; charset=utf-8')
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
         return response
+
+
+class ImageUploadViewSet(mixins.CreateModelMixin,
+                         mixins.RetrieveModelMixin,
+                         viewsets.GenericViewSet):
+    """Загрузка картинок рецептов, в том числе по частям с докачкой.
+
+    POST с файлом в multipart загружает картинку целиком, POST с
+    размером файла создает загрузку, в которую части дописываются
+    запросами PATCH с заголовком Upload-Offset. GET возвращает,
+    сколько байт уже загружено.
+    """
+    serializer_class = ImageUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser]
+    http_method_names = ['get', 'post', 'patch']
+    lookup_field = 'token'
+
+    def get_queryset(self):
+        return ImageUpload.objects.filter(user=self.request.user)
+
+    def partial_update(self, request, token):
+        with transaction.atomic():
+            upload = get_object_or_404(
+                self.get_queryset().select_for_update(), token=token)
+            if request.headers.get('Upload-Offset') != str(upload.offset):
+                return Response({'offset': upload.offset},
+                                status=status.HTTP_409_CONFLICT)
+            try:
+                write_chunk(upload, request.stream)
+            except UploadOverflow:
+                return Response('Размер загрузки превышен',
+                                status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(upload)
+        return Response(serializer.data, headers={
+            'Upload-Offset': str(upload.offset)})
+
+
+def metrics(request):
+    """Метрики всех процессов в текстовом формате Prometheus.
+
+    Доступны сотрудникам и по заголовку Authorization: Bearer
+    <METRICS_TOKEN>.
+    """
+    token = settings.METRICS_TOKEN
+    if not (token and compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {token}'.encode()) or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(collect()),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.middleware import observe_queries
+        from core.search import restore_search_triggers
+        observe_queries()
+        post_migrate.connect(restore_search_triggers,
+                             sender=self.apps.get_app_config('recipes'))
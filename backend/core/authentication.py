@@ -0,0 +1,168 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions, serializers
+from rest_framework.authentication import (TokenAuthentication,
+                                           get_authorization_header)
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, UntypedToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from users.models import DeniedToken
+
+User = get_user_model()
+
+
+def deny_token(token):
+    """Отзыв refresh-токена до окончания срока его действия.
+
+    Уникальный jti записывается в таблицу DeniedToken, из двух
+    одновременных запросов с одним токеном запись создает только
+    один. Возвращает False, если токен уже отозван. Истекшие записи
+    удаляет команда clean_denied_tokens.
+    """
+    try:
+        with transaction.atomic():
+            DeniedToken.objects.create(
+                jti=token[api_settings.JTI_CLAIM],
+                expires_at=datetime_from_epoch(token['exp']))
+    except IntegrityError:
+        return False
+    return True
+
+
+def is_denied(token):
+    return DeniedToken.objects.filter(
+        jti=token[api_settings.JTI_CLAIM]).exists()
+
+
+def get_refresh_token(value):
+    try:
+        return RefreshToken(value)
+    except TokenError as error:
+        raise InvalidToken(error.args[0])
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Аутентификация по access-токену без запроса к базе данных.
+
+    Пользователь создается из id в токене, остальные поля
+    загружаются одним запросом при первом обращении к ним.
+    Отключенный пользователь теряет доступ после истечения
+    access-токена, refresh-токен для него не обновляется.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('В токене нет id пользователя')
+        return User.from_db(None, [api_settings.USER_ID_FIELD], [user_id])
+
+
+async def authenticate_token(authenticator, request):
+    """Проверка токена djoser асинхронным ORM, ошибки как в DRF."""
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != authenticator.keyword.lower().encode():
+        return None
+    if len(auth) == 1:
+        raise exceptions.AuthenticationFailed(
+            _('Invalid token header. No credentials provided.'))
+    if len(auth) > 2:
+        raise exceptions.AuthenticationFailed(
+            _('Invalid token header. Token string should not contain '
+              'spaces.'))
+    try:
+        key = auth[1].decode()
+    except UnicodeError:
+        raise exceptions.AuthenticationFailed(
+            _('Invalid token header. Token string should not contain '
+              'invalid characters.'))
+
+    model = authenticator.get_model()
+    try:
+        token = await model.objects.select_related('user').aget(key=key)
+    except model.DoesNotExist:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    if not token.user.is_active:
+        raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+    return token.user, token
+
+
+async def aauthenticate(request):
+    """Аутентификация запроса DRF в асинхронном представлении.
+
+    Access-токен JWT проверяется без обращения к базе данных, токен
+    djoser - асинхронным ORM, остальные способы аутентификации
+    выполняются в потоке через sync_to_async. После нее request.user
+    доступен без запросов к базе данных.
+    """
+    for authenticator in request.authenticators:
+        try:
+            if isinstance(authenticator, StatelessJWTAuthentication):
+                user_auth = authenticator.authenticate(request)
+            elif isinstance(authenticator, TokenAuthentication):
+                user_auth = await authenticate_token(authenticator, request)
+            else:
+                user_auth = await sync_to_async(
+                    authenticator.authenticate)(request)
+        except exceptions.APIException:
+            request._not_authenticated()
+            raise
+        if user_auth is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = user_auth
+            return
+    request._not_authenticated()
+
+
+class DenylistTokenRefreshSerializer(serializers.Serializer):
+    """Обновление пары токенов.
+
+    Переданный refresh-токен отзывается, повторно его использовать
+    нельзя, в том числе в параллельном запросе.
+    """
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        refresh = get_refresh_token(attrs['refresh'])
+        if not User.objects.filter(
+                **{api_settings.USER_ID_FIELD:
+                   refresh[api_settings.USER_ID_CLAIM]},
+                is_active=True).exists():
+            raise InvalidToken('Пользователь не найден или отключен')
+        if not deny_token(refresh):
+            raise InvalidToken('Токен отозван')
+        data = {'access': str(refresh.access_token)}
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data['refresh'] = str(refresh)
+        return data
+
+
+class DenylistTokenVerifySerializer(serializers.Serializer):
+    """Проверка токена, отозванный refresh-токен недействителен."""
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        token = UntypedToken(attrs['token'])
+        if (token.get(api_settings.TOKEN_TYPE_CLAIM)
+                == RefreshToken.token_type and is_denied(token)):
+            raise InvalidToken('Токен отозван')
+        return {}
+
+
+class TokenLogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        try:
+            deny_token(RefreshToken(attrs['refresh']))
+        except TokenError as error:
+            raise serializers.ValidationError({'refresh': error.args[0]})
+        return attrs
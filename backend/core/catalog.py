@@ -0,0 +1,20 @@
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog_version'
+
+
+def get_catalog_version():
+    """Версия справочников тегов и ингредиентов и время ее изменения."""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, (uuid4().hex, time.time()), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Новая версия справочников после изменения тегов или ингредиентов."""
+    cache.set(CATALOG_VERSION_KEY, (uuid4().hex, time.time()), None)
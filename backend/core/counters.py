@@ -0,0 +1,91 @@
+from django.apps import apps as global_apps
+from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+BATCH_SIZE = 1000
+
+# Счетчик, модель со связью и имя связи.
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorites', 'recipe'),
+    ('recipes.Recipe', 'shopping_cart_count', 'recipes.ShoppingCart',
+     'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Follow', 'author'),
+    ('users.User', 'following_count', 'users.Follow', 'user'),
+)
+
+
+class CounterField(models.PositiveIntegerField):
+    """Количество связанных строк, изменяется только через F()."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('default', 0)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+
+class CountersModel(models.Model):
+    """Модель со счетчиками.
+
+    При сохранении существующей строки счетчики не записываются,
+    чтобы устаревшие значения объекта не затерли изменения,
+    сделанные параллельными запросами.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred
+                and not isinstance(field, CounterField)]
+        super().save(*args, **kwargs)
+
+
+def change_counter(model, id, field, delta=1):
+    """Изменение счетчика одним запросом UPDATE.
+
+    Строки, созданные в обход API (например, в админке), счетчик
+    не учитывает, поэтому при уменьшении он не опускается ниже нуля,
+    а расхождение исправляет команда recount_counters.
+    """
+    if delta > 0:
+        model.objects.filter(id=id).update(**{field: F(field) + delta})
+    elif delta < 0:
+        model.objects.filter(id=id).update(
+            **{field: Greatest(F(field) + delta, 0)})
+
+
+def get_actual_count(source, relation):
+    return Coalesce(Subquery(
+        source.objects.filter(**{relation: OuterRef('id')}).order_by()
+        .values(relation).annotate(count=Count('id')).values('count')), 0)
+
+
+def recount(counters=COUNTERS, ids=None, check=False, apps=global_apps):
+    """Исправление счетчиков, которые разошлись с данными.
+
+    Возвращает количество неверных значений каждого счетчика.
+    ids - id строк модели со счетчиком, по умолчанию все строки,
+    apps - реестр моделей, в миграциях передается исторический.
+    """
+    result = {}
+    for model, field, source, relation in counters:
+        model = apps.get_model(model)
+        actual = get_actual_count(apps.get_model(source), relation)
+        queryset = model.objects.alias(actual=actual).exclude(
+            **{field: F('actual')})
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        wrong = list(queryset.values_list('id', flat=True))
+        if not check:
+            for start in range(0, len(wrong), BATCH_SIZE):
+                model.objects.filter(
+                    id__in=wrong[start:start + BATCH_SIZE]).update(
+                        **{field: actual})
+        result[f'{model.__name__}.{field}'] = len(wrong)
+    return result
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+BATCH_SIZE = 1000
+
+
+def is_fan_out_author(author_id):
+    """Рецепты автора записываются в ленты подписчиков.
+
+    Рецепты авторов с большим числом подписчиков не записываются
+    в ленты и читаются из таблицы рецептов при запросе ленты.
+    Счетчик читается из базы, объект автора мог устареть.
+    """
+    User = global_apps.get_model('users', 'User')
+    return User.objects.filter(
+        id=author_id,
+        followers_count__lte=settings.FEED_FANOUT_LIMIT).exists()
+
+
+def fan_out(recipe):
+    """Новый рецепт в ленты подписчиков автора.
+
+    Если рецепт не записан в ленты, он отмечается fanned_out=False
+    и читается при запросе ленты, даже когда у автора станет меньше
+    подписчиков. Ленты, в которые записан рецепт, обрезаются.
+    """
+    Recipe = global_apps.get_model('recipes', 'Recipe')
+    if not is_fan_out_author(recipe.author_id):
+        recipe.fanned_out = False
+        Recipe.objects.filter(id=recipe.id).update(fanned_out=False)
+        return
+    Follow = global_apps.get_model('users', 'Follow')
+    TimelineEntry = global_apps.get_model('recipes', 'TimelineEntry')
+    followers = Follow.objects.filter(author_id=recipe.author_id).values_list(
+        'user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    for batch in batches(followers):
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=user_id, recipe_id=recipe.id,
+                           author_id=recipe.author_id,
+                           pub_date=recipe.pub_date)
+             for user_id in batch),
+            ignore_conflicts=True)
+        trim_timelines(batch)
+
+
+def backfill_timeline(user, author):
+    """Последние разосланные рецепты автора в ленту нового подписчика.
+
+    Остальные рецепты автора читаются при запросе ленты.
+    """
+    Recipe = global_apps.get_model('recipes', 'Recipe')
+    TimelineEntry = global_apps.get_model('recipes', 'TimelineEntry')
+    recipes = Recipe.objects.filter(author=author, fanned_out=True).order_by(
+        '-pub_date', '-id').values_list('id', 'pub_date')[
+            :settings.FEED_TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user.id, recipe_id=id, author_id=author.id,
+                       pub_date=pub_date)
+         for id, pub_date in recipes),
+        ignore_conflicts=True)
+    trim_timelines([user.id])
+
+
+def remove_from_timeline(user, author):
+    """Рецепты автора из ленты бывшего подписчика."""
+    TimelineEntry = global_apps.get_model('recipes', 'TimelineEntry')
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def batches(iterable):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def trim_timelines(users_id=None, apps=global_apps):
+    """Удаление записей лент сверх FEED_TIMELINE_LENGTH.
+
+    Записи удаляются в базе данных пачками по BATCH_SIZE
+    пользователей. Возвращает количество удаленных записей.
+    """
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    if users_id is None:
+        users_id = TimelineEntry.objects.order_by('user_id').values_list(
+            'user_id', flat=True).distinct().iterator(chunk_size=BATCH_SIZE)
+    deleted = 0
+    for batch in batches(users_id):
+        extra = TimelineEntry.objects.filter(user_id__in=batch).annotate(
+            position=Window(
+                RowNumber(), partition_by=F('user_id'),
+                order_by=[F('pub_date').desc(), F('recipe_id').desc()]),
+        ).filter(position__gt=settings.FEED_TIMELINE_LENGTH).values('id')
+        deleted += TimelineEntry.objects.filter(id__in=extra).delete()[0]
+    return deleted
+
+
+def rebuild_timelines(users_id=None, apps=global_apps):
+    """Ленты пользователей заново по их подпискам.
+
+    Ленты пачки пользователей записываются одним запросом
+    INSERT ... SELECT по подпискам и разосланным рецептам авторов,
+    в каждую ленту попадают последние FEED_TIMELINE_LENGTH рецептов.
+    users_id - id пользователей, по умолчанию все подписчики.
+    Возвращает количество записей.
+    """
+    Follow = apps.get_model('users', 'Follow')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    TimelineEntry = apps.get_model('recipes', 'TimelineEntry')
+    using = router.db_for_write(TimelineEntry)
+    connection = connections[using]
+    if users_id is None:
+        users_id = Follow.objects.using(using).order_by(
+            'user_id').values_list('user_id', flat=True).distinct().iterator(
+                chunk_size=BATCH_SIZE)
+    columns = ', '.join(
+        connection.ops.quote_name(
+            TimelineEntry._meta.get_field(field).column)
+        for field in ('user', 'recipe', 'author', 'pub_date'))
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    insert = f'INSERT INTO {table} ({columns}) '
+    total = 0
+    for batch in batches(users_id):
+        TimelineEntry.objects.using(using).filter(user_id__in=batch).delete()
+        # Из рецептов каждого автора в ленту попадают не больше
+        # FEED_TIMELINE_LENGTH последних, остальные не соединяются
+        # с подписками.
+        latest = Recipe.objects.using(using).filter(
+            fanned_out=True, author_id__in=Follow.objects.filter(
+                user_id__in=batch).values('author_id'),
+        ).annotate(position=Window(
+            RowNumber(), partition_by=F('author_id'),
+            order_by=[F('pub_date').desc(), F('id').desc()]),
+        ).filter(position__lte=settings.FEED_TIMELINE_LENGTH).values('id')
+        position = Window(
+            RowNumber(), partition_by=F('user_id'),
+            order_by=[F('author__recipes__pub_date').desc(),
+                      F('author__recipes__id').desc()])
+        entries = Follow.objects.using(using).filter(
+            user_id__in=batch, author__recipes__in=latest,
+        ).annotate(position=position).filter(
+            position__lte=settings.FEED_TIMELINE_LENGTH)
+        sql, params = entries.order_by().values_list(
+            'user_id', 'author__recipes__id', 'author_id',
+            'author__recipes__pub_date').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(insert + sql, params)
+            total += cursor.rowcount
+    return total
+
+
+def before(queryset, cursor, id_field):
+    """Строки после курсора (pub_date, id) в порядке убывания.
+
+    Условие по pub_date ограничивает диапазон индекса, строки с той же
+    датой отсекаются по id.
+    """
+    if cursor is None:
+        return queryset
+    pub_date, id = cursor
+    return queryset.filter(pub_date__lte=pub_date).exclude(
+        pub_date=pub_date, **{f'{id_field}__gte': id})
+
+
+def get_feed(user, cursor, limit):
+    """Ключи (pub_date, id рецепта) страницы ленты.
+
+    Записи ленты читаются одним проходом по индексу
+    timeline_user_pub_date_idx. Рецепты, которые не записывались
+    в ленты, читаются по частичному индексу recipe_not_fanned_out_idx
+    и объединяются с лентой.
+    """
+    Follow = global_apps.get_model('users', 'Follow')
+    Recipe = global_apps.get_model('recipes', 'Recipe')
+    TimelineEntry = global_apps.get_model('recipes', 'TimelineEntry')
+    timeline = before(
+        TimelineEntry.objects.filter(user=user), cursor, 'recipe_id',
+    ).order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit]
+    recipes = before(
+        Recipe.objects.filter(
+            fanned_out=False,
+            author_id__in=Follow.objects.filter(user=user).values(
+                'author_id')),
+        cursor, 'id',
+    ).order_by('-pub_date', '-id').values_list('pub_date', 'id')[:limit]
+    return list(itertools.islice(
+        heapq.merge(timeline, recipes, reverse=True), limit))
@@ -1,15 +1,82 @@
 import base64
+import binascii
+import io
 
+from django.conf import settings
 from django.core.files.base import ContentFile
+from PIL import Image
 from rest_framework import serializers
 
+from core.uploads import open_upload
+
+# Сколько символов base64 раскодировать, чтобы прочитать
+# заголовок картинки, должно делиться на 4.
+HEADER_BASE64_LENGTH = 64 * 1024
+
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка в base64, файлом или токеном загрузки по частям."""
+    default_error_messages = {
+        'invalid_upload': 'Загрузка не найдена или не завершена',
+        'too_large': 'Размер картинки не должен превышать {max_size} байт',
+        'too_many_pixels': 'Картинка {width}x{height} слишком большая',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            if len(imgstr) * 3 // 4 > settings.IMAGE_MAX_UPLOAD_SIZE:
+                self.fail('too_large',
+                          max_size=settings.IMAGE_MAX_UPLOAD_SIZE)
+            # Размеры проверяются по заголовку до раскодирования
+            # всей картинки.
+            try:
+                checked = self.validate_size(
+                    base64.b64decode(imgstr[:HEADER_BASE64_LENGTH]))
+                content = base64.b64decode(imgstr)
+            except (binascii.Error, ValueError):
+                self.fail('invalid_image')
+            if not checked:
+                self.validate_size(content)
+            return super().to_internal_value(
+                ContentFile(content, name='temp.' + ext))
+
+        if isinstance(data, str):
+            request = self.context.get('request')
+            upload = request and open_upload(request.user, data)
+            if not upload:
+                self.fail('invalid_upload')
+            try:
+                return self.to_internal_value(upload)
+            except serializers.ValidationError:
+                upload.close()
+                raise
+
+        if hasattr(data, 'size') and hasattr(data, 'read'):
+            if data.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+                self.fail('too_large',
+                          max_size=settings.IMAGE_MAX_UPLOAD_SIZE)
+            if not self.validate_size(data.read(HEADER_BASE64_LENGTH)):
+                data.seek(0)
+                self.validate_size(data.read())
+            data.seek(0)
 
         return super().to_internal_value(data)
+
+    def validate_size(self, header):
+        """Проверка количества пикселей по заголовку картинки.
+
+        Возвращает False, если заголовок не поместился
+        в переданные байты.
+        """
+        try:
+            width, height = Image.open(io.BytesIO(header)).size
+        except Image.DecompressionBombError:
+            self.fail('invalid_image')
+        except OSError:
+            return False
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', width=width, height=height)
+        return True
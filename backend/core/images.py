@@ -0,0 +1,126 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# Расширение файла, формат Pillow и параметры сохранения.
+# Формат пропускается, если Pillow собран без его поддержки.
+VARIANT_FORMATS = [
+    (extension, format, options)
+    for extension, format, options in (
+        ('avif', 'AVIF', {'quality': 60}),
+        ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+        ('jpg', 'JPEG', {'quality': 80, 'optimize': True,
+                         'progressive': True}),
+    )
+    if features.check(extension)
+]
+
+image_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS,
+    thread_name_prefix='image-variants')
+
+
+def schedule_image_variants(recipe):
+    """Создание уменьшенных копий картинки после сохранения рецепта."""
+    recipe_id, image = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: image_executor.submit(create_image_variants,
+                                      recipe_id, image))
+
+
+def create_image_variants(recipe_id, image):
+    """Уменьшенные копии картинки рецепта во всех форматах.
+
+    Выполняется в пуле потоков, поэтому соединение с базой данных
+    закрывается после работы.
+    """
+    try:
+        save_variants(recipe_id, image, render_variants(image))
+    except Exception:
+        logger.exception('Не удалось создать копии картинки %s', image)
+    finally:
+        connection.close()
+
+
+def save_variants(recipe_id, image, variants):
+    """Сохранение копий картинки в рецепте, файлы прежних копий
+    удаляются.
+
+    Если картинку заменили, пока создавались копии, удаляются
+    новые копии. Возвращает False в этом случае.
+    """
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().only(
+            'image_variants').filter(id=recipe_id, image=image).first()
+        if recipe is not None:
+            Recipe.objects.filter(id=recipe_id).update(
+                image_variants=variants)
+    delete_variants(variants if recipe is None else recipe.image_variants)
+    return recipe is not None
+
+
+def delete_variants(variants):
+    for sizes in variants.values():
+        for _, name in sizes:
+            default_storage.delete(name)
+
+
+def render_variants(image):
+    with default_storage.open(image) as file:
+        original = Image.open(file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'transparency' in
+                                    original.info else 'RGB')
+
+    root = os.path.splitext(os.path.basename(image))[0]
+    variants = {}
+    for width in settings.IMAGE_VARIANT_WIDTHS:
+        if width > original.width and variants:
+            break
+        resized = original.copy()
+        resized.thumbnail((width, original.height), Image.LANCZOS)
+        for extension, format, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            (resized.convert('RGB') if format == 'JPEG' else resized).save(
+                buffer, format, **options)
+            name = default_storage.save(
+                f'recipes/images/variants/{root}_{resized.width}.{extension}',
+                ContentFile(buffer.getvalue()))
+            variants.setdefault(extension, []).append(
+                [resized.width, name])
+    return variants
+
+
+def get_image_variants(recipe, request=None):
+    """Адреса уменьшенных копий картинки в формате srcset.
+
+    Пока копии не созданы, возвращается пустой словарь.
+    """
+    if not recipe.image_variants:
+        return {}
+
+    def url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    result = {}
+    for extension, sizes in recipe.image_variants.items():
+        result[extension] = ', '.join(
+            f'{url(name)} {width}w' for width, name in sizes)
+    jpeg = recipe.image_variants.get('jpg')
+    if jpeg:
+        result['thumbnail'] = url(jpeg[0][1])
+    return result
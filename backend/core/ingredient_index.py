@@ -0,0 +1,169 @@
+import re
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from core.catalog import get_catalog_version
+from recipes.models import Ingredient
+
+
+def normalize(value):
+    """Приведение названия к виду для поиска."""
+    return re.sub(r'\s+', ' ', value.casefold().replace('ё', 'е')).strip()
+
+
+class TrieNode:
+    __slots__ = ('children', 'items')
+
+    def __init__(self):
+        self.children = {}
+        self.items = []
+
+
+class IngredientIndex:
+    """Индекс ингредиентов для автодополнения.
+
+    Префиксное дерево по названиям и по каждому слову в названии.
+    В каждом узле хранятся лучшие ингредиенты поддерева, поэтому
+    поиск по префиксу не зависит от размера справочника. Если
+    совпадений по префиксу нет, ищутся названия с опечатками.
+    """
+
+    def __init__(self, ingredients, limit):
+        self.limit = limit
+        self.root = TrieNode()
+        self.ingredients = {}
+
+        keys = []
+        for ingredient in ingredients:
+            self.ingredients[ingredient['id']] = ingredient
+            name = normalize(ingredient['name'])
+            # Совпадение с началом названия важнее совпадения
+            # с началом одного из следующих слов.
+            keys.append(((0, len(name), name), name, ingredient['id']))
+            for match in re.finditer(r'(?<=[\s\-(«"])\w', name):
+                keys.append(((1, len(name), name), name[match.start():],
+                             ingredient['id']))
+        keys.sort(key=lambda key: key[0])
+
+        for _, key, id in keys:
+            node = self.root
+            self.add_item(node, id)
+            for char in key:
+                node = node.children.setdefault(char, TrieNode())
+                self.add_item(node, id)
+
+    def add_item(self, node, id):
+        if len(node.items) < self.limit and id not in node.items:
+            node.items.append(id)
+
+    def search(self, query, limit=None):
+        limit = min(limit or self.limit, self.limit)
+        query = normalize(query)
+        node = self.root
+        for char in query:
+            node = node.children.get(char)
+            if node is None:
+                break
+        else:
+            return [self.ingredients[id] for id in node.items[:limit]]
+
+        if len(query) < 3:
+            return []
+        max_distance = 1 if len(query) <= 5 else 2
+        found = sorted(self.fuzzy(query, max_distance))[:limit]
+        return [self.ingredients[id] for _, id in found]
+
+    def fuzzy(self, query, max_distance):
+        """Ингредиенты, начало названия которых отличается от запроса
+        не больше чем на max_distance правок (расстояние Левенштейна).
+
+        Первая буква запроса считается верной, это сокращает перебор
+        в десятки раз.
+        """
+        found = {}
+        node = self.root.children.get(query[0])
+        if node is None:
+            return ()
+        first_row = list(range(len(query) + 1))
+        stack = [(node, query[0], first_row, 1)]
+        while stack:
+            node, char, previous_row, depth = stack.pop()
+            row = [previous_row[0] + 1]
+            for column in range(1, len(query) + 1):
+                row.append(min(
+                    row[column - 1] + 1,
+                    previous_row[column] + 1,
+                    previous_row[column - 1] + (query[column - 1] != char)
+                ))
+            if row[-1] <= max_distance:
+                # Ближе к запросу совпадения с меньшим числом правок
+                # и с той же длиной, что и у запроса.
+                for position, id in enumerate(node.items):
+                    rank = (row[-1], abs(depth - len(query)), position)
+                    if found.get(id, rank) >= rank:
+                        found[id] = rank
+                continue
+            if min(row) <= max_distance:
+                stack.extend((child, next_char, row, depth + 1)
+                             for next_char, child in node.children.items())
+        return ((rank, id) for id, rank in found.items())
+
+
+class IngredientIndexHolder:
+    """Индекс текущего процесса, перестраивается после изменения
+    версии справочников в любом из процессов.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        index = self.index
+        version = get_catalog_version()
+        if index is None or self.version != version:
+            with self.lock:
+                if self.index is index:
+                    self.update(version, self.get_queryset().iterator())
+                index = self.index
+        return index
+
+    async def aget(self):
+        """get для асинхронных представлений.
+
+        Ингредиенты читаются асинхронным ORM без блокировки, при
+        одновременном перестроении в нескольких запросах сохраняется
+        один из индексов.
+        """
+        index = self.index
+        version = get_catalog_version()
+        if index is None or self.version != version:
+            ingredients = [
+                ingredient async for ingredient in self.get_queryset()]
+            with self.lock:
+                if self.index is index:
+                    self.update(version, ingredients)
+                index = self.index
+        return index
+
+    def get_queryset(self):
+        # Индекс хранится до смены версии справочников, см. TagBits.
+        return Ingredient.objects.using(DEFAULT_DB_ALIAS).values(
+            'id', 'name', 'measurement_unit').order_by('id')
+
+    def update(self, version, ingredients):
+        self.version = version
+        self.index = IngredientIndex(ingredients,
+                                     settings.INGREDIENT_SEARCH_LIMIT)
+
+    def search(self, query, limit=None):
+        return self.get().search(query, limit)
+
+    async def asearch(self, query, limit=None):
+        return (await self.aget()).search(query, limit)
+
+
+ingredient_index = IngredientIndexHolder()
@@ -0,0 +1,140 @@
+from django.contrib.auth.models import AnonymousUser
+from rest_framework import serializers
+
+from recipes.models import Favorites, ShoppingCart
+from users.models import Follow
+
+
+class RecipeViewerState:
+    """Избранное и список покупок текущего пользователя.
+
+    Загружает данные одним запросом на каждый признак сразу
+    для всех рецептов страницы, для анонимных пользователей
+    запросы не выполняются.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded = set()
+        self.favorited = set()
+        self.in_shopping_cart = set()
+        # Устанавливаются фильтром, когда в выборку попали только
+        # рецепты из избранного или из списка покупок.
+        self.all_favorited = False
+        self.all_in_shopping_cart = False
+
+    def get_pending(self, recipes_id):
+        """Id рецептов, данные которых еще не загружены."""
+        recipes_id = set(recipes_id) - self.loaded
+        if not self.user.is_authenticated:
+            return set()
+        self.loaded |= recipes_id
+        return recipes_id
+
+    def load(self, recipes_id):
+        recipes_id = self.get_pending(recipes_id)
+        if not recipes_id:
+            return
+        if not self.all_favorited:
+            self.favorited.update(self.get_recipes_id(Favorites, recipes_id))
+        if not self.all_in_shopping_cart:
+            self.in_shopping_cart.update(
+                self.get_recipes_id(ShoppingCart, recipes_id))
+
+    async def aload(self, recipes_id):
+        """load для асинхронных представлений."""
+        recipes_id = self.get_pending(recipes_id)
+        if not recipes_id:
+            return
+        if not self.all_favorited:
+            self.favorited.update([id async for id in self.get_recipes_id(
+                Favorites, recipes_id)])
+        if not self.all_in_shopping_cart:
+            self.in_shopping_cart.update([
+                id async for id in self.get_recipes_id(
+                    ShoppingCart, recipes_id)])
+
+    def get_recipes_id(self, model, recipes_id):
+        return model.objects.filter(
+            user=self.user, recipe_id__in=recipes_id).values_list(
+                'recipe_id', flat=True)
+
+    def is_favorited(self, recipe):
+        if not self.user.is_authenticated:
+            return False
+        if self.all_favorited:
+            return True
+        self.load([recipe.id])
+        return recipe.id in self.favorited
+
+    def is_in_shopping_cart(self, recipe):
+        if not self.user.is_authenticated:
+            return False
+        if self.all_in_shopping_cart:
+            return True
+        self.load([recipe.id])
+        return recipe.id in self.in_shopping_cart
+
+
+class SubscriptionLoader:
+    """Подписки текущего пользователя на авторов.
+
+    Загружает подписки одним запросом для всех авторов страницы.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded = set()
+        self.subscribed = set()
+
+    def get_subscribed(self, authors_id):
+        """Запрос подписок на авторов, которые еще не загружены."""
+        authors_id = set(authors_id) - self.loaded
+        if not authors_id or not self.user.is_authenticated:
+            return Follow.objects.none()
+        self.loaded |= authors_id
+        return Follow.objects.filter(
+            user=self.user, author_id__in=authors_id).values_list(
+                'author_id', flat=True)
+
+    def load(self, authors_id):
+        self.subscribed.update(self.get_subscribed(authors_id))
+
+    async def aload(self, authors_id):
+        """load для асинхронных представлений."""
+        self.subscribed.update(
+            [id async for id in self.get_subscribed(authors_id)])
+
+    def is_subscribed(self, author):
+        if not self.user.is_authenticated:
+            return False
+        self.load([author.id])
+        return author.id in self.subscribed
+
+
+def get_loader(request, loader_class):
+    """Загрузчик, общий для всех сериализаторов одного запроса."""
+    if request is None:
+        return loader_class(AnonymousUser())
+    loaders = request.__dict__.setdefault('loaders', {})
+    if loader_class not in loaders:
+        loaders[loader_class] = loader_class(request.user)
+    return loaders[loader_class]
+
+
+class LoaderListSerializer(serializers.ListSerializer):
+    """Заранее загружает данные для всех объектов страницы.
+
+    Дочерний сериализатор должен определить метод preload(instances).
+    """
+
+    def to_representation(self, data):
+        data = list(data.all() if hasattr(data, 'all') else data)
+        self.child.preload(data)
+        return super().to_representation(data)
+
+    async def apreload(self, data):
+        """Загрузка данных асинхронным ORM до сериализации, после
+        нее to_representation не обращается к базе данных.
+        """
+        await self.child.apreload(data)
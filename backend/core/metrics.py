@@ -0,0 +1,240 @@
+import atexit
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Имя, тип, описание, метки и границы корзин гистограмм.
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Количество запросов', ('route', 'method', 'status'),
+        None),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса', ('route', 'method'),
+        LATENCY_BUCKETS),
+    'foodgram_db_queries': (
+        'histogram', 'Количество запросов к базе данных на запрос',
+        ('route', 'method'), QUERY_BUCKETS),
+    'foodgram_db_duration_seconds': (
+        'histogram', 'Время запросов к базе данных на запрос',
+        ('route', 'method'), LATENCY_BUCKETS),
+    'foodgram_http_response_size_bytes': (
+        'histogram', 'Размер ответа', ('route', 'method'), SIZE_BUCKETS),
+}
+
+
+class Registry:
+    """Метрики текущего процесса.
+
+    Каждый процесс gunicorn периодически сохраняет свои значения
+    в файл METRICS_ROOT/<pid>-<время запуска>.json, при выдаче метрик
+    значения всех файлов складываются. Файлы завершившихся процессов
+    переносятся в архив, чтобы счетчики не уменьшались, а каталог
+    не рос.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # После fork значения родителя не должны попасть в файл
+        # дочернего процесса.
+        self.lock = threading.Lock()
+        self.values = {}
+        self.flushed = 0
+        self.worker = f'{os.getpid()}-{time.time_ns()}'
+
+    def inc(self, name, labels):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + 1
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.values.get(key)
+            if histogram is None:
+                # Счетчики корзин, затем сумма и количество значений.
+                histogram = self.values[key] = [0] * (len(buckets) + 3)
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return to_snapshot(self.values)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        write_json(f'{self.worker}.json', self.snapshot())
+
+
+registry = Registry()
+os.register_at_fork(after_in_child=registry.reset)
+atexit.register(lambda: registry.values and registry.flush())
+
+ARCHIVE = 'archive.json'
+WORKER_RE = re.compile(r'(\d+(?:-\d+)?)\.json')
+
+
+def write_json(name, data):
+    os.makedirs(settings.METRICS_ROOT, exist_ok=True)
+    descriptor, path = tempfile.mkstemp(dir=settings.METRICS_ROOT,
+                                        suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(data, file)
+    os.replace(path, os.path.join(settings.METRICS_ROOT, name))
+
+
+def read_json(name, default=None):
+    try:
+        with open(os.path.join(settings.METRICS_ROOT, name)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return default
+
+
+def to_snapshot(values):
+    return [[name, list(labels), value if isinstance(value, int)
+             else list(value)]
+            for (name, labels), value in values.items()]
+
+
+def add_snapshot(values, snapshot):
+    for metric, labels, value in snapshot:
+        key = (metric, tuple(labels))
+        if isinstance(value, list):
+            total = values.setdefault(key, [0] * len(value))
+            for index, item in enumerate(value):
+                total[index] += item
+        else:
+            values[key] = values.get(key, 0) + value
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def parse_worker(worker):
+    """pid и время запуска процесса, у файлов прежнего формата
+    <pid>.json время запуска 0.
+    """
+    pid, _, started = worker.partition('-')
+    return int(pid), int(started or 0)
+
+
+def get_dead_workers(workers):
+    """Процессы, которые завершились.
+
+    Если pid занят новым процессом, файл с более ранним временем
+    запуска принадлежит завершившемуся процессу.
+    """
+    latest = {}
+    for worker in workers:
+        pid, started = parse_worker(worker)
+        latest[pid] = max(latest.get(pid, started), started)
+    dead = []
+    for worker in workers:
+        pid, started = parse_worker(worker)
+        if started < latest[pid] or not is_alive(pid):
+            dead.append(worker)
+    return dead
+
+
+def archive_dead_workers(workers):
+    """Перенос значений завершившихся процессов в архив.
+
+    Архив хранит id перенесенных процессов, пока их файлы не удалены,
+    поэтому сбой между записью архива и удалением файла не приводит
+    к повторному учету значений.
+    """
+    with open(os.path.join(settings.METRICS_ROOT, 'archive.lock'),
+              'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = read_json(ARCHIVE, {'workers': [], 'values': []})
+        merged = set(archive['workers'])
+        dead = [worker for worker in get_dead_workers(workers)
+                if worker not in merged]
+        if dead:
+            values = {}
+            add_snapshot(values, archive['values'])
+            for worker in dead:
+                add_snapshot(values, read_json(f'{worker}.json', []))
+            archive = {'workers': sorted(merged.union(dead)),
+                       'values': to_snapshot(values)}
+            write_json(ARCHIVE, archive)
+        for worker in archive['workers']:
+            try:
+                os.remove(os.path.join(settings.METRICS_ROOT,
+                                       f'{worker}.json'))
+            except FileNotFoundError:
+                pass
+        if archive['workers']:
+            archive['workers'] = []
+            write_json(ARCHIVE, archive)
+        return archive['values']
+
+
+def collect():
+    """Сумма значений метрик всех процессов."""
+    registry.flush()
+    workers = [match[1] for match in map(WORKER_RE.fullmatch,
+                                         os.listdir(settings.METRICS_ROOT))
+               if match]
+    values = {}
+    add_snapshot(values, archive_dead_workers(workers))
+    for worker in workers:
+        add_snapshot(values, read_json(f'{worker}.json', []))
+    return values
+
+
+def format_labels(names, labels, *extra):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, labels)]
+    pairs.extend(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(values):
+    """Метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric, (kind, description, names, buckets) in METRICS.items():
+        lines.append(f'# HELP {metric} {description}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for (name, labels), value in sorted(values.items()):
+            if name != metric:
+                continue
+            if kind == 'counter':
+                lines.append(f'{metric}{format_labels(names, labels)} '
+                             f'{value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), value):
+                cumulative += count
+                bucket = format_labels(names, labels, f'le="{bound}"')
+                lines.append(f'{metric}_bucket{bucket} {cumulative}')
+            lines.append(f'{metric}_sum{format_labels(names, labels)} '
+                         f'{value[-2]}')
+            lines.append(f'{metric}_count{format_labels(names, labels)} '
+                         f'{value[-1]}')
+    return '\n'.join(lines) + '\n'
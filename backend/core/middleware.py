@@ -0,0 +1,215 @@
+import random
+import time
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from core.metrics import registry
+from core.profiler import QueryRecorder, report
+
+# Обертки запросов к базе данных текущего запроса. Переменные контекста
+# передаются в потоки sync_to_async, поэтому запросы асинхронных
+# представлений учитываются в своем запросе, даже если несколько
+# запросов используют одно соединение.
+query_counter = ContextVar('query_counter', default=None)
+query_recorder = ContextVar('query_recorder', default=None)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Обертка соединений, передает запрос оберткам текущего запроса."""
+    for observer in (query_counter, query_recorder):
+        wrapper = observer.get()
+        if wrapper is not None:
+            execute = partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def install_execute_wrapper(sender=None, connection=None, **kwargs):
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def observe_queries():
+    """Обертка для уже открытых и для новых соединений любого потока.
+
+    Вызывается при запуске приложения, до открытия соединений
+    в потоках, в которых выполняются запросы.
+    """
+    connection_created.connect(install_execute_wrapper,
+                               dispatch_uid='core.middleware')
+    for connection in connections.all(initialized_only=True):
+        install_execute_wrapper(connection=connection)
+
+
+class QueryCounter:
+    """Обертка запросов к базе данных, считает их количество и время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+class QueryObserverMiddleware:
+    """Наблюдение за запросами к базе данных во время обработки запроса.
+
+    Для потоковых ответов наблюдение заканчивается после отправки
+    последней части, так как запросы к базе данных выполняются
+    во время отправки. Middleware работает и в WSGI, и в ASGI:
+    асинхронные представления не переводятся в синхронный поток.
+    """
+    sync_capable = True
+    async_capable = True
+    observer = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self.reset()
+            raise
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, state)
+        else:
+            self.finish(request, response, len(response.content), state)
+        return response
+
+    async def __acall__(self, request):
+        state = self.start()
+        try:
+            response = await self.get_response(request)
+        except Exception:
+            self.reset()
+            raise
+        if response.streaming:
+            stream = self.astream if response.is_async else self.stream
+            response.streaming_content = stream(
+                response.streaming_content, request, response, state)
+        else:
+            await self.afinish(request, response, len(response.content),
+                               state)
+        return response
+
+    def stream(self, content, request, response, state):
+        size = 0
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.finish(request, response, size, state)
+
+    async def astream(self, content, request, response, state):
+        size = 0
+        try:
+            async for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            await self.afinish(request, response, size, state)
+
+    def start(self):
+        """Начало наблюдения, возвращает состояние для finish."""
+        return None
+
+    def finish(self, request, response, size, state):
+        """Конец наблюдения после отправки ответа."""
+        self.reset()
+
+    def reset(self):
+        if self.observer is not None:
+            self.observer.set(None)
+
+    async def afinish(self, request, response, size, state):
+        self.finish(request, response, size, state)
+
+
+class MetricsMiddleware(QueryObserverMiddleware):
+    """Время обработки, запросы к базе данных и размер ответа
+    по имени маршрута.
+    """
+    observer = query_counter
+
+    def start(self):
+        counter = QueryCounter()
+        self.observer.set(counter)
+        return time.perf_counter(), counter
+
+    def finish(self, request, response, size, state):
+        self.reset()
+        start, counter = state
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        labels = (route, request.method)
+        registry.inc('foodgram_http_requests_total',
+                     labels + (str(response.status_code),))
+        registry.observe('foodgram_http_request_duration_seconds', labels,
+                         time.perf_counter() - start)
+        registry.observe('foodgram_db_queries', labels, counter.count)
+        registry.observe('foodgram_db_duration_seconds', labels,
+                         counter.duration)
+        registry.observe('foodgram_http_response_size_bytes', labels, size)
+        registry.maybe_flush()
+
+
+class ProfilerMiddleware(QueryObserverMiddleware):
+    """Профиль запросов к базе данных для доли PROFILER_SAMPLE_RATE
+    запросов и всех запросов дольше PROFILER_SLOW_THRESHOLD секунд.
+
+    Включается настройкой PROFILER_ENABLED, профили записываются
+    в журнал foodgram.profiler.
+    """
+    observer = query_recorder
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def start(self):
+        recorder = QueryRecorder()
+        self.observer.set(recorder)
+        return (time.perf_counter(),
+                random.random() < settings.PROFILER_SAMPLE_RATE, recorder)
+
+    def is_reported(self, state):
+        start, sampled, _ = state
+        return (sampled or time.perf_counter() - start
+                >= settings.PROFILER_SLOW_THRESHOLD)
+
+    def finish(self, request, response, size, state):
+        self.reset()
+        start, sampled, recorder = state
+        if self.is_reported(state):
+            report(request, response, time.perf_counter() - start,
+                   recorder, sampled)
+
+    async def afinish(self, request, response, size, state):
+        # EXPLAIN выполняется в соединении потока, в котором
+        # выполнялись запросы.
+        if self.is_reported(state):
+            await sync_to_async(self.finish)(request, response, size, state)
+        else:
+            self.reset()
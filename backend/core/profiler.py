@@ -0,0 +1,124 @@
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger('foodgram.profiler')
+
+# Списки параметров IN разной длины считаются одним видом запроса.
+IN_PARAMS = re.compile(r'IN \((?:%s, )*%s\)')
+SKIPPED_FILES = ('/core/profiler.py', '/core/middleware.py')
+
+
+def get_call_site():
+    """Вызовы кода проекта, которые привели к запросу, начиная
+    с ближайшего.
+
+    Кадры стека просматриваются без traceback, чтобы запись
+    каждого запроса оставалась дешевой.
+    """
+    root = str(settings.BASE_DIR)
+    stack = []
+    frame = sys._getframe(3)
+    while frame is not None and len(stack) < settings.PROFILER_STACK_DEPTH:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(root) and '/site-packages/' not in filename
+                and not filename.endswith(SKIPPED_FILES)):
+            stack.append(f'{filename[len(root) + 1:]}:{frame.f_lineno} '
+                         f'{frame.f_code.co_name}')
+        frame = frame.f_back
+    return stack
+
+
+def get_shape(sql):
+    return IN_PARAMS.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """Обертка запросов к базе данных, сохраняет текст, время
+    и место вызова каждого запроса.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.dropped = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.queries) >= settings.PROFILER_MAX_QUERIES:
+                self.dropped += 1
+            else:
+                self.append(context['connection'], sql, params, many,
+                            time.perf_counter() - start)
+
+    def append(self, connection, sql, params, many, duration):
+        self.queries.append({
+            'connection': connection,
+            'sql': sql,
+            'params': params,
+            'many': many,
+            'duration': duration,
+            'stack': get_call_site(),
+        })
+
+
+def explain(query):
+    """План запроса без его выполнения, только для SELECT."""
+    connection = query['connection']
+    if query['many'] or not query['sql'].lstrip().upper().startswith(
+            'SELECT'):
+        return None
+    prefix = connection.ops.explain_query_prefix()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {query["sql"]}', query['params'])
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+    except DatabaseError as error:
+        return [f'EXPLAIN не выполнен: {error}']
+
+
+def report(request, response, duration, recorder, sampled):
+    """Запись профиля запроса в журнал.
+
+    Параметры запросов в журнал не попадают, в них могут быть
+    токены и персональные данные.
+    """
+    match = request.resolver_match
+    queries = recorder.queries
+    shapes = Counter(get_shape(query['sql']) for query in queries)
+    slowest = max(queries, key=lambda query: query['duration'],
+                  default=None)
+    logger.info(json.dumps({
+        'route': match.view_name if match else 'unmatched',
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'duration': round(duration, 6),
+        'sampled': sampled,
+        'db_queries': len(queries) + recorder.dropped,
+        'db_duration': round(sum(query['duration'] for query in queries), 6),
+        'repeated': [
+            {'sql': shape, 'count': count}
+            for shape, count in shapes.most_common()
+            if count >= settings.PROFILER_REPEAT_THRESHOLD],
+        'slowest': slowest and {
+            'sql': slowest['sql'],
+            'duration': round(slowest['duration'], 6),
+            'stack': slowest['stack'],
+            'plan': explain(slowest),
+        },
+        'queries': [
+            {'database': query['connection'].alias, 'sql': query['sql'],
+             'duration': round(query['duration'], 6),
+             'stack': query['stack']}
+            for query in queries],
+    }, ensure_ascii=False))
@@ -0,0 +1,73 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'replica_pin'
+PIN_KEY = 'replica_pin:{}'
+
+# Реплика, из которой читает текущий запрос. Устанавливается
+# api.mixins.ReplicaReadMixin только для безопасных запросов,
+# остальные запросы, команды и миграции работают с основной базой.
+read_database = ContextVar('read_database', default=None)
+
+# Время, до которого реплика не используется после ошибки соединения.
+unavailable = {}
+
+
+class ReplicaRouter:
+    """Чтение из реплики запроса, запись и миграции в основной базе."""
+
+    def db_for_read(self, model, **hints):
+        return read_database.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def get_replica():
+    """Случайная доступная реплика или None."""
+    now = time.monotonic()
+    replicas = [alias for alias in settings.REPLICA_DATABASES
+                if unavailable.get(alias, 0) <= now]
+    return random.choice(replicas) if replicas else None
+
+
+def mark_unavailable(alias):
+    unavailable[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+
+
+def pin_to_primary(request, response):
+    """Чтение пользователя из основной базы после записи, пока
+    реплики не получили изменения.
+
+    Отметка хранится в подписанной cookie, которую общий кэш не может
+    вытеснить, и в кэше для клиентов без cookie.
+    """
+    user_id = str(request.user.pk)
+    response.set_signed_cookie(
+        PIN_COOKIE, user_id, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS, secure=request.is_secure(),
+        httponly=True, samesite='Lax')
+    cache.set(PIN_KEY.format(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(request):
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    pinned_id = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS)
+    return (pinned_id == str(user.pk)
+            or bool(cache.get(PIN_KEY.format(user.pk))))
@@ -0,0 +1,162 @@
+import re
+
+from django.core import checks
+from django.db import connection, connections
+
+SEARCH_CONFIG = 'russian'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+SQLITE_FTS_TRIGGERS = {
+    f'{SQLITE_FTS_TABLE}_insert':
+        f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_insert
+        AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+    f'{SQLITE_FTS_TABLE}_delete':
+        f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_delete
+        AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END""",
+    f'{SQLITE_FTS_TABLE}_update':
+        f"""CREATE TRIGGER IF NOT EXISTS {SQLITE_FTS_TABLE}_update
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+}
+
+TOKEN_RE = re.compile(r'"([^"]*)"|(\w+)(\*?)')
+WORD_RE = re.compile(r'\w+')
+
+
+def parse_query(query):
+    """Разбор поискового запроса.
+
+    Возвращает список условий (слова, префикс): фраза в кавычках
+    дает несколько слов, слово со звездочкой на конце ищется
+    как префикс.
+    """
+    terms = []
+    for phrase, word, star in TOKEN_RE.findall(query):
+        if phrase:
+            words = WORD_RE.findall(phrase)
+            if words:
+                terms.append((words, False))
+        else:
+            terms.append(([word], bool(star)))
+    return terms
+
+
+def to_tsquery(terms):
+    """Запрос для to_tsquery в PostgreSQL."""
+    parts = []
+    for words, prefix in terms:
+        part = ' <-> '.join(words)
+        parts.append(f'{part}:*' if prefix else f'({part})')
+    return ' & '.join(parts)
+
+
+def to_fts5_query(terms):
+    """Запрос для MATCH в SQLite FTS5."""
+    parts = []
+    for words, prefix in terms:
+        part = '"' + ' '.join(words) + '"'
+        parts.append(f'{part}*' if prefix else part)
+    return ' '.join(parts)
+
+
+def search_vector():
+    """Вектор PostgreSQL, название весит больше описания.
+
+    Выражение совпадает с индексом recipe_search_idx.
+    """
+    from django.contrib.postgres.search import SearchVector
+
+    return (SearchVector('name', config=SEARCH_CONFIG, weight='A')
+            + SearchVector('text', config=SEARCH_CONFIG, weight='B'))
+
+
+def get_missing_triggers(db):
+    """Недостающие триггеры индекса FTS5 в базе SQLite.
+
+    Пустой список, если база не SQLite или индекса еще нет.
+    """
+    if (db.vendor != 'sqlite'
+            or SQLITE_FTS_TABLE not in db.introspection.table_names()):
+        return []
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'recipes_recipe'")
+        existing = {name for name, in cursor.fetchall()}
+    return [name for name in SQLITE_FTS_TRIGGERS if name not in existing]
+
+
+def restore_search_triggers(sender=None, using='default', **kwargs):
+    """Обработчик post_migrate, восстанавливает триггеры FTS5.
+
+    В SQLite AddField и AlterField пересоздают таблицу recipes_recipe
+    вместе с ее триггерами, поэтому после каждой миграции недостающие
+    триггеры создаются заново и индекс перестраивается.
+    """
+    db = connections[using]
+    missing = get_missing_triggers(db)
+    if missing:
+        with db.cursor() as cursor:
+            for name in missing:
+                cursor.execute(SQLITE_FTS_TRIGGERS[name])
+            cursor.execute(f'INSERT INTO {SQLITE_FTS_TABLE}'
+                           f"({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+
+@checks.register(checks.Tags.database)
+def check_search_triggers(app_configs, databases=None, **kwargs):
+    errors = []
+    for alias in databases or ():
+        missing = get_missing_triggers(connections[alias])
+        if missing:
+            errors.append(checks.Warning(
+                f'В базе {alias} нет триггеров поиска: '
+                f'{", ".join(missing)}',
+                hint='Выполните migrate, триггеры создаются после миграций',
+                id='core.W001'))
+    return errors
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск рецептов по названию и описанию.
+
+    Результаты упорядочены по релевантности.
+    """
+    terms = parse_query(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        vector = search_vector()
+        search_query = SearchQuery(to_tsquery(terms), config=SEARCH_CONFIG,
+                                   search_type='raw')
+        return queryset.annotate(search=vector).filter(
+            search=search_query).annotate(
+                rank=SearchRank(vector, search_query)).order_by('-rank', '-id')
+
+    if connection.vendor == 'sqlite':
+        # Совпадение в названии весит больше, чем в описании.
+        return queryset.extra(
+            select={'rank': f'bm25({SQLITE_FTS_TABLE}, 10.0, 1.0)'},
+            tables=[SQLITE_FTS_TABLE],
+            where=[f'{SQLITE_FTS_TABLE} MATCH %s',
+                   f'{SQLITE_FTS_TABLE}.rowid = '
+                   f'{queryset.model._meta.db_table}.id'],
+            params=[to_fts5_query(terms)],
+        ).order_by('rank', '-id')
+
+    words = [word for words, _ in terms for word in words]
+    for word in words:
+        queryset = queryset.filter(name__icontains=word)
+    return queryset
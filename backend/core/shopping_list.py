@@ -0,0 +1,190 @@
+import csv
+import io
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import BoundedSemaphore
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from recipes.models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+CHUNK_SIZE = 500
+
+pdf_executor = ThreadPoolExecutor(
+    max_workers=settings.SHOPPING_LIST_PDF_WORKERS,
+    thread_name_prefix='shopping-list-pdf')
+# Не больше одной задачи в очереди на каждый поток,
+# остальные запросы сразу получают отказ.
+pdf_slots = BoundedSemaphore(settings.SHOPPING_LIST_PDF_WORKERS * 2)
+
+
+class Echo:
+    """Буфер для csv.writer, который сразу возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def get_shopping_list(user):
+    """Ингредиенты из списка покупок пользователя с суммарным количеством."""
+    return ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount').order_by('ingredient__name')
+
+
+def get_recipe_amounts(recipe, sign=1):
+    """Количество каждого ингредиента рецепта."""
+    return {
+        ingredient_id: sign * amount
+        for ingredient_id, amount in RecipeIngredient.objects.filter(
+            recipe=recipe).values_list('ingredients_id', 'amount')
+    }
+
+
+@transaction.atomic
+def update_shopping_lists(users_id, delta):
+    """Изменение списков покупок пользователей.
+
+    delta - изменение количества для каждого ингредиента,
+    строки с нулевым количеством удаляются. Недостающие строки
+    создаются с нулевым количеством, строку, созданную параллельным
+    запросом, увеличивает тот же UPDATE.
+    """
+    delta = {id: amount for id, amount in delta.items() if amount}
+    users_id = list(users_id)
+    if not delta:
+        return
+    ingredients_by_amount = defaultdict(list)
+    for id, amount in delta.items():
+        ingredients_by_amount[amount].append(id)
+
+    for start in range(0, len(users_id), CHUNK_SIZE):
+        chunk = users_id[start:start + CHUNK_SIZE]
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=user_id, ingredient_id=id, amount=0)
+             for user_id in chunk
+             for id, amount in delta.items() if amount > 0),
+            ignore_conflicts=True)
+        for amount, ingredients_id in ingredients_by_amount.items():
+            ShoppingListItem.objects.filter(
+                user_id__in=chunk, ingredient_id__in=ingredients_id,
+            ).update(amount=F('amount') + amount)
+        ShoppingListItem.objects.filter(user_id__in=chunk,
+                                        ingredient_id__in=delta,
+                                        amount__lte=0).delete()
+
+
+def update_cart_shopping_list(cart, sign=1):
+    """Ингредиенты рецепта в списке покупок владельца корзины.
+
+    Вызывается из сигналов ShoppingCart, поэтому списки покупок
+    верны и после изменений в админке и каскадных удалений.
+    """
+    update_shopping_lists([cart.user_id],
+                          get_recipe_amounts(cart.recipe_id, sign))
+
+
+def update_ingredient_shopping_lists(recipe_ingredient, sign=1):
+    """Ингредиент рецепта в списках покупок всех корзин с рецептом."""
+    if recipe_ingredient.recipe_id is None:
+        return
+    update_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_ingredient.recipe_id).values_list(
+                'user_id', flat=True),
+        {recipe_ingredient.ingredients_id: sign * recipe_ingredient.amount})
+
+
+def get_expected_shopping_lists(users_id=None):
+    """Списки покупок, посчитанные заново по рецептам в корзинах."""
+    ingredients = RecipeIngredient.objects.filter(
+        recipe__shoppingcart__isnull=False)
+    if users_id is not None:
+        ingredients = ingredients.filter(
+            recipe__shoppingcart__user__in=users_id)
+    return {
+        (user_id, ingredient_id): total_amount
+        for user_id, ingredient_id, total_amount in ingredients.values(
+            'recipe__shoppingcart__user', 'ingredients').annotate(
+                total_amount=Sum('amount')).values_list(
+                    'recipe__shoppingcart__user', 'ingredients',
+                    'total_amount').iterator(chunk_size=CHUNK_SIZE)
+    }
+
+
+def stream_txt(ingredients):
+    """Построчная выгрузка списка покупок в текстовом формате."""
+    yield 'Список покупок:\n'
+    for name, measurement_unit, total_amount in ingredients.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield f'{name} - {total_amount} {measurement_unit}\n'
+
+
+def stream_csv(ingredients):
+    """Построчная выгрузка списка покупок в формате csv."""
+    writer = csv.writer(Echo())
+    # BOM нужен, чтобы Excel правильно определил кодировку.
+    yield '\ufeff'
+    yield writer.writerow(('Ингредиент', 'Количество', 'Единица измерения'))
+    for name, measurement_unit, total_amount in ingredients.iterator(
+            chunk_size=CHUNK_SIZE):
+        yield writer.writerow((name, total_amount, measurement_unit))
+
+
+def render_pdf(rows):
+    """Создание pdf файла со списком покупок."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    font = 'ShoppingListFont'
+    if font not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(font, settings.SHOPPING_LIST_PDF_FONT))
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin, line_height = 50, 18
+
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, height - margin, 'Список покупок:')
+    pdf.setFont(font, 12)
+    y = height - margin - line_height * 2
+    for name, measurement_unit, total_amount in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(margin, y,
+                       f'• {name} - {total_amount} {measurement_unit}')
+        y -= line_height
+    pdf.save()
+    return buffer.getvalue()
+
+
+def create_pdf(ingredients):
+    """Создание pdf в отдельном пуле потоков.
+
+    Возвращает None, если все потоки пула заняты
+    или pdf не удалось создать за отведенное время.
+    """
+    if not pdf_slots.acquire(blocking=False):
+        return None
+    try:
+        rows = list(ingredients.iterator(chunk_size=CHUNK_SIZE))
+        future = pdf_executor.submit(render_pdf, rows)
+    except BaseException:
+        pdf_slots.release()
+        raise
+    # Место освобождается, когда pdf создан, даже если запрос
+    # уже получил отказ по времени.
+    future.add_done_callback(lambda future: pdf_slots.release())
+    try:
+        return future.result(timeout=settings.SHOPPING_LIST_PDF_TIMEOUT)
+    except TimeoutError:
+        return None
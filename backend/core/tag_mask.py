@@ -0,0 +1,106 @@
+from django.apps import apps as global_apps
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+
+from core.catalog import get_catalog_version
+
+# Старший бит BIGINT не используется, чтобы маска оставалась
+# положительной во всех базах данных.
+TAG_MASK_BITS = 63
+
+
+def get_mask(bits):
+    """Маска из номеров битов, теги без бита пропускаются."""
+    mask = 0
+    for bit in bits:
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+def with_any_tag(queryset, mask):
+    """Рецепты, в маске которых есть хотя бы один бит из mask."""
+    return queryset.alias(tag_bits=F('tags_mask').bitand(mask)).filter(
+        tag_bits__gt=0)
+
+
+def assign_tag_bits(apps=global_apps):
+    """Свободные биты тегам, у которых их нет.
+
+    Если тег уже есть в рецептах, бит добавляется в их маски.
+    Теги сверх TAG_MASK_BITS остаются без бита, рецепты с ними
+    фильтруются через RecipeTag.
+    """
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    used = set(Tag.objects.exclude(bit=None).values_list('bit', flat=True))
+    for tag_id in Tag.objects.filter(bit=None).order_by('id').values_list(
+            'id', flat=True):
+        while True:
+            bit = next((bit for bit in range(TAG_MASK_BITS)
+                        if bit not in used), None)
+            if bit is None:
+                return
+            used.add(bit)
+            # Бит мог занять тег, добавленный в параллельной транзакции,
+            # тогда берется следующий. Тег без бита в условии, чтобы
+            # не выдать второй бит тегу, которому его уже выдали.
+            try:
+                with transaction.atomic():
+                    assigned = Tag.objects.filter(
+                        id=tag_id, bit=None).update(bit=bit)
+            except IntegrityError:
+                continue
+            break
+        if not assigned:
+            used.discard(bit)
+            continue
+        Recipe.objects.filter(id__in=RecipeTag.objects.filter(
+            tag_id=tag_id).values('recipe_id')).update(
+                tags_mask=F('tags_mask').bitor(1 << bit))
+
+
+def release_tag_bit(tag):
+    """Удаление бита тега из масок рецептов перед удалением тега."""
+    if tag.bit is not None:
+        Recipe = global_apps.get_model('recipes', 'Recipe')
+        with_any_tag(Recipe.objects.all(), 1 << tag.bit).update(
+            tags_mask=F('tags_mask') - (1 << tag.bit))
+
+
+class TagBits:
+    """Биты тегов по слагу, перечитываются после изменения
+    версии справочников.
+    """
+
+    def __init__(self):
+        self.cached = (None, {})
+
+    def get(self):
+        version = get_catalog_version()
+        cached_version, bits = self.cached
+        if cached_version != version:
+            bits = dict(self.get_queryset())
+            self.cached = (version, bits)
+        return bits
+
+    async def aget(self):
+        """get для асинхронных представлений, перечитывает биты
+        асинхронным ORM, чтобы следующий get не обращался к базе данных.
+        """
+        version = get_catalog_version()
+        cached_version, bits = self.cached
+        if cached_version != version:
+            bits = {slug: bit async for slug, bit in self.get_queryset()}
+            self.cached = (version, bits)
+        return bits
+
+    def get_queryset(self):
+        # Биты хранятся до смены версии справочников, поэтому читаются
+        # из основной базы, а не из отстающей реплики.
+        Tag = global_apps.get_model('recipes', 'Tag')
+        return Tag.objects.using(DEFAULT_DB_ALIAS).values_list('slug', 'bit')
+
+
+tag_bits = TagBits()
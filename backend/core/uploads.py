@@ -0,0 +1,101 @@
+import os
+from uuid import UUID
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image
+
+from recipes.models import ImageUpload
+
+
+class UploadOverflow(Exception):
+    """Загружено больше, чем было заявлено при создании загрузки."""
+
+
+class UploadedImage(File):
+    """Файл завершенной загрузки, читается с диска по частям.
+
+    Как у временных файлов загрузок Django, путь доступен через
+    temporary_file_path: ImageField открывает картинку по пути,
+    а FileSystemStorage перемещает файл, а не копирует его.
+    """
+
+    def __init__(self, upload, name):
+        super().__init__(open(upload.path, 'rb'), name=name)
+        self.upload = upload
+
+    def temporary_file_path(self):
+        return self.upload.path
+
+
+def create_upload(user, size, file=None):
+    """Создание загрузки, файл целиком записывается сразу, если передан."""
+    upload = ImageUpload.objects.create(user=user, size=size)
+    os.makedirs(settings.UPLOAD_ROOT, exist_ok=True)
+    with open(upload.path, 'wb') as destination:
+        if file is not None:
+            for chunk in file.chunks(settings.UPLOAD_CHUNK_SIZE):
+                destination.write(chunk)
+    if file is not None:
+        upload.offset = size
+        upload.save(update_fields=['offset'])
+    return upload
+
+
+def write_chunk(upload, stream):
+    """Дописывание части файла из потока запроса по кускам.
+
+    Тело запроса не читается в память целиком.
+    """
+    remaining = upload.size - upload.offset
+    with open(upload.path, 'r+b') as destination:
+        destination.seek(upload.offset)
+        while stream is not None:
+            chunk = stream.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(chunk) > remaining:
+                destination.truncate(upload.offset)
+                raise UploadOverflow
+            destination.write(chunk)
+            remaining -= len(chunk)
+        destination.truncate()
+    upload.offset = upload.size - remaining
+    upload.save(update_fields=['offset'])
+    return upload
+
+
+def open_upload(user, token):
+    """Файл завершенной загрузки пользователя или None.
+
+    Файл закрывается и загрузка удаляется после сохранения рецепта,
+    см. delete_used_upload.
+    """
+    try:
+        token = UUID(token)
+    except ValueError:
+        return None
+    upload = ImageUpload.objects.filter(token=token, user=user).first()
+    if upload is None or not upload.is_complete:
+        return None
+    try:
+        with Image.open(upload.path) as image:
+            extension = image.format.lower()
+    except OSError:
+        return None
+    return UploadedImage(upload, name=f'{upload.token.hex}.{extension}')
+
+
+def delete_used_upload(image):
+    """Закрытие файла загрузки, из которой взята картинка, и удаление
+    загрузки после фиксации транзакции с рецептом."""
+    if isinstance(image, UploadedImage):
+        image.close()
+        transaction.on_commit(lambda: delete_upload(image.upload))
+
+
+def delete_upload(upload):
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+    upload.delete()
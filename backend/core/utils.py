@@ -1,9 +1,19 @@
-from django.db.models import Sum
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.response import Response
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag
+from core.counters import change_counter
+from core.shopping_list import update_shopping_lists
+from core.tag_mask import get_mask
+from recipes.models import (Favorites, Recipe, RecipeIngredient, RecipeTag,
+                            ShoppingCart)
+
+# Счетчик рецепта для избранного и списка покупок.
+RECIPE_COUNTERS = {
+    Favorites: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
 
 
 def create_delete_instance(request, model, serializer, id):
@@ -18,7 +28,13 @@ def create_delete_instance(request, model, serializer, id):
                                 context={'request': request,
                                          'recipe': get_recipe(id)})
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, recipe=get_recipe(id))
+        try:
+            with transaction.atomic():
+                serializer.save(user=request.user, recipe=get_recipe(id))
+                change_counter(Recipe, id, RECIPE_COUNTERS[model])
+        except IntegrityError:
+            # Рецепт добавлен параллельным запросом после проверки.
+            raise serializers.ValidationError(serializer.message_post)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     if request.method == 'DELETE':
@@ -29,46 +45,106 @@ def create_delete_instance(request, model, serializer, id):
                                 context={'request': request,
                                          'recipe': get_recipe(id)})
         serializer.is_valid(raise_exception=True)
-        model.objects.filter(user=request.user,
-                             recipe=get_recipe(id)).delete()
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(user=request.user,
+                                              recipe=get_recipe(id)).delete()
+            change_counter(Recipe, id, RECIPE_COUNTERS[model], -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def get_recipes_limit(request):
+    """Количество рецептов автора из параметра recipes_limit."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if not recipes_limit:
+        return None
+    try:
+        recipes_limit = int(recipes_limit)
+    except ValueError:
+        recipes_limit = -1
+    if recipes_limit < 0:
+        raise serializers.ValidationError(
+            {'recipes_limit': 'Должно быть целым неотрицательным числом'})
+    return recipes_limit
+
+
 def get_recipe(id):
     return get_object_or_404(Recipe, id=id)
 
 
-def create_update_ingredients(ingredients, instance):
-    """Создание или обновление ингредиентов рецепта."""
-    for ingredient in ingredients:
-        id = ingredient.get('ingredients').get('id')
-        amount = ingredient.get('amount')
-        ingredient = Ingredient.objects.get(id=id)
-        RecipeIngredient.objects.create(recipe=instance,
-                                        ingredients=ingredient,
-                                        amount=amount)
+def create_update_ingredients(ingredients, instance, created=False):
+    """Создание или обновление ингредиентов рецепта.
+
+    Изменяются только те строки, которые действительно отличаются
+    от сохраненных в базе данных.
+    """
+    amounts = {
+        ingredient.get('ingredients').get('id'): ingredient.get('amount')
+        for ingredient in ingredients
+    }
+    current = {} if created else {
+        recipe_ingredient.ingredients_id: recipe_ingredient
+        for recipe_ingredient in RecipeIngredient.objects.filter(
+            recipe=instance)
+    }
+    # Изменение количества ингредиентов для списков покупок. Удаленные
+    # строки вычитаются из списков сигналом post_delete, bulk_update
+    # и bulk_create сигналов не отправляют.
+    delta = {
+        id: amount - (current[id].amount if id in current else 0)
+        for id, amount in amounts.items()}
+
+    removed = [recipe_ingredient.id
+               for id, recipe_ingredient in current.items()
+               if id not in amounts]
+    if removed:
+        RecipeIngredient.objects.filter(id__in=removed).delete()
+
+    changed = []
+    for id, recipe_ingredient in current.items():
+        if id in amounts and recipe_ingredient.amount != amounts[id]:
+            recipe_ingredient.amount = amounts[id]
+            changed.append(recipe_ingredient)
+    if changed:
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=instance, ingredients_id=id, amount=amount)
+        for id, amount in amounts.items() if id not in current
+    )
 
+    if not created:
+        update_shopping_lists(
+            ShoppingCart.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True),
+            delta)
 
-def create_update_tags(tags, instance):
-    """Создание или обновление тегов рецепта."""
-    for tag in tags:
-        RecipeTag.objects.create(recipe=instance, tag=tag)
 
+def create_update_tags(tags, instance, created=False):
+    """Создание или обновление тегов рецепта и его маски тегов."""
+    tags_id = {tag.id for tag in tags}
+    current = set() if created else set(
+        RecipeTag.objects.filter(recipe=instance).values_list('tag_id',
+                                                              flat=True))
+    if current - tags_id:
+        RecipeTag.objects.filter(recipe=instance,
+                                 tag_id__in=current - tags_id).delete()
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=instance, tag_id=id) for id in tags_id - current
+    )
+    instance.tags_mask = get_mask(tag.bit for tag in tags)
+    Recipe.objects.filter(id=instance.id).update(
+        tags_mask=instance.tags_mask)
 
-def create_shopping_list(request):
-    """Создание списка покупок."""
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__shoppingcart__user=request.user).values(
-        'ingredients__name',
-        'ingredients__measurement_unit').annotate(
-            total_amount=Sum('amount'))
 
-    shop_list = ['Список покупок:\n']
+def bulk_create_recipes(recipes):
+    """Запись рецептов пачкой с заданной датой публикации.
 
-    for ingredient in ingredients:
-        shop_list.append(
-            f'{ingredient["ingredients__name"]} - {ingredient["total_amount"]}'
-            f' {ingredient["ingredients__measurement_unit"]}\n'
-        )
-    return shop_list
+    bulk_create заполняет поле с auto_now_add текущим временем, поэтому
+    даты записываются вторым запросом, а поле модели не меняется.
+    """
+    pub_dates = [recipe.pub_date for recipe in recipes]
+    Recipe.objects.bulk_create(recipes)
+    for recipe, pub_date in zip(recipes, pub_dates):
+        recipe.pub_date = pub_date
+    Recipe.objects.bulk_update(recipes, ['pub_date'])
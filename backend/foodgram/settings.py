@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilerMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +85,61 @@ DATABASES = {
 #     }
 # }
 
+# Постоянные соединения с проверкой перед первым запросом
+# в каждом HTTP-запросе.
+DATABASES['default'].update(
+    CONN_MAX_AGE=int(os.getenv('CONN_MAX_AGE', 60)),
+    CONN_HEALTH_CHECKS=True,
+)
+
+# Реплики для чтения через запятую: файлы SQLite или host[:port]
+# серверов PostgreSQL, см. core.routers. Файлы SQLite обновляются
+# командой sync_replicas.
+REPLICA_DATABASES = []
+for number, replica in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(', ')), 1):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        location = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        location = {'HOST': host,
+                    'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica{number}')
+if REPLICA_DATABASES:
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы
+# и сколько секунд не используется недоступная реплика.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+
+# Кэш default общий для всех процессов gunicorn, в нем хранится
+# версия справочников тегов и ингредиентов. Ответы справочников
+# хранятся в памяти каждого процесса, см. api.mixins.CatalogCacheMixin.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              os.path.join(BASE_DIR, 'cache')),
+        # Файловый кэш удаляет случайные записи, когда их больше
+        # MAX_ENTRIES (по умолчанию 300).
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 100000)),
+        },
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog',
+        'TIMEOUT': int(os.getenv('CATALOG_CACHE_TIMEOUT', 600)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -144,4 +202,89 @@ DJOSER = {
     'HIDE_USERS': False,
     'SET_PASSWORD_RETYPE': False}
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 2))
+SHOPPING_LIST_PDF_TIMEOUT = int(os.getenv('SHOPPING_LIST_PDF_TIMEOUT', 30))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 30))
+
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('IMAGE_MAX_UPLOAD_SIZE',
+                                      10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25_000_000))
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+UPLOAD_ROOT = os.getenv('UPLOAD_ROOT', os.path.join(BASE_DIR, 'uploads'))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_EXPIRE_HOURS = int(os.getenv('UPLOAD_EXPIRE_HOURS', 24))
+
+METRICS_ROOT = os.getenv('METRICS_ROOT', os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# Токен для сбора метрик Prometheus, без него метрики доступны
+# только сотрудникам.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# Профилирование запросов к базе данных, см. core.middleware.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', False) == 'True'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0.01))
+PROFILER_SLOW_THRESHOLD = float(os.getenv('PROFILER_SLOW_THRESHOLD', 1))
+PROFILER_REPEAT_THRESHOLD = int(os.getenv('PROFILER_REPEAT_THRESHOLD', 5))
+PROFILER_STACK_DEPTH = 8
+PROFILER_MAX_QUERIES = 1000
+PROFILER_LOG = os.getenv('PROFILER_LOG',
+                         os.path.join(BASE_DIR, 'profiler.log'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'profiler': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': PROFILER_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'foodgram.profiler': {
+            'handlers': ['profiler'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Длина ленты подписок и число подписчиков, после которого рецепты
+# автора не записываются в ленты, см. core.feed.
+FEED_TIMELINE_LENGTH = int(os.getenv('FEED_TIMELINE_LENGTH', 500))
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+
+# Вход по JWT вместе с токенами djoser, access-токен проверяется
+# без запроса к базе данных, см. core.authentication.
+JWT_ENABLED = os.getenv('JWT_ENABLED', False) == 'True'
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        minutes=int(os.getenv('JWT_ACCESS_MINUTES', 5))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        days=int(os.getenv('JWT_REFRESH_DAYS', 7))),
+    'ROTATE_REFRESH_TOKENS': True,
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER':
+        'core.authentication.DenylistTokenRefreshSerializer',
+    'TOKEN_VERIFY_SERIALIZER':
+        'core.authentication.DenylistTokenVerifySerializer',
+}
+if JWT_ENABLED:
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'core.authentication.StatelessJWTAuthentication')
+
+# Чтение рецептов, тегов, ингредиентов, пользователей и подписок
+# асинхронными представлениями, включается при запуске через ASGI,
+# см. gunicorn_asgi.py и api.mixins.AsyncReadMixin.
+ASYNC_READS = os.getenv('ASYNC_READS', False) == 'True'
+
 CSRF_TRUSTED_ORIGINS = [os.getenv('CSRF_TRUSTED_ORIGINS')]
@@ -0,0 +1,23 @@
+"""Настройки gunicorn для запуска через ASGI.
+
+    gunicorn -c gunicorn_asgi.py
+
+Каждый процесс uvicorn обрабатывает запросы в цикле событий:
+чтение выполняется асинхронными представлениями (ASYNC_READS),
+запись - синхронными представлениями DRF в потоке процесса.
+"""
+import multiprocessing
+import os
+
+os.environ.setdefault('ASYNC_READS', 'True')
+
+wsgi_app = 'foodgram.asgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker'
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+# Запросы асинхронного ORM Django 4.2 выполняются в одном потоке
+# процесса, поэтому процессов нужно столько же, сколько в WSGI.
+workers = int(os.getenv('GUNICORN_WORKERS',
+                        multiprocessing.cpu_count() * 2 + 1))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
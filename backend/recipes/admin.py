@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from core.constance import EMPTY_VALUE_DISPLAY
 from recipes.models import (Favorites, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+                            ShoppingCart, ShoppingListItem, Tag)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -12,16 +12,14 @@ class RecipeIngredientInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'count_favorites')
+    list_display = ('id', 'name', 'author', 'favorites_count',
+                    'shopping_cart_count')
     list_filter = ('author__username', 'name', 'tags__name')
     search_fields = ('name', 'author__username')
     empty_value_display = EMPTY_VALUE_DISPLAY
-    readonly_fields = ('count_favorites',)
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
     inlines = (RecipeIngredientInline, )
 
-    def count_favorites(self, obj):
-        return obj.favorites.count()
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -57,3 +55,10 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
     empty_value_display = EMPTY_VALUE_DISPLAY
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    empty_value_display = EMPTY_VALUE_DISPLAY
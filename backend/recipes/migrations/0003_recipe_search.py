@@ -0,0 +1,74 @@
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+SEARCH_INDEX_NAME = 'recipe_search_idx'
+SQLITE_FTS_TABLE = 'recipes_recipe_fts'
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(
+        name, text, content='recipes_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_insert
+        AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_delete
+        AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END""",
+    f"""CREATE TRIGGER {SQLITE_FTS_TABLE}_update
+        AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END""",
+    f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')",
+]
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {SQLITE_FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}',
+]
+
+
+def get_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('name', 'text', config=SEARCH_CONFIG),
+                    name=SEARCH_INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('recipes', 'Recipe'),
+                                get_index())
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('recipes', 'Recipe'),
+                                   get_index())
+    elif vendor == 'sqlite':
+        for sql in SQLITE_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+            keep_id=models.Min('id'), count=models.Count('id')).filter(
+                count__gt=1)
+    for duplicate in duplicates:
+        keep_id = duplicate['keep_id']
+        ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']).exclude(
+                id=keep_id).values_list('id', flat=True))
+        RecipeIngredient.objects.filter(ingredients_id__in=ids).update(
+            ingredients_id=keep_id)
+        for item in ShoppingListItem.objects.filter(ingredient_id__in=ids):
+            updated = ShoppingListItem.objects.filter(
+                user_id=item.user_id, ingredient_id=keep_id).update(
+                    amount=models.F('amount') + item.amount)
+            if updated:
+                item.delete()
+            else:
+                item.ingredient_id = keep_id
+                item.save(update_fields=['ingredient'])
+        Ingredient.objects.filter(id__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_imageupload'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 4.2.11 on 2026-10-18 17:58
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+NAME_INDEX_NAME = 'ingredient_name_lower_idx'
+
+
+def get_name_index(vendor):
+    expression = django.db.models.functions.text.Lower('name')
+    if vendor == 'postgresql':
+        from django.contrib.postgres.indexes import OpClass
+
+        # Без varchar_pattern_ops индекс не используется для LIKE
+        # при сортировке строк, отличной от C.
+        expression = OpClass(expression, name='varchar_pattern_ops')
+    return models.Index(expression, name=NAME_INDEX_NAME)
+
+
+def create_name_index(apps, schema_editor):
+    schema_editor.add_index(
+        apps.get_model('recipes', 'Ingredient'),
+        get_name_index(schema_editor.connection.vendor))
+
+
+def drop_name_index(apps, schema_editor):
+    schema_editor.remove_index(
+        apps.get_model('recipes', 'Ingredient'),
+        get_name_index(schema_editor.connection.vendor))
+
+
+def delete_duplicates(model, fields, merge=None):
+    """Удаление повторов по fields, остается строка с наименьшим id."""
+    duplicates = model.objects.values(*fields).annotate(
+        keep_id=models.Min('id'), count=models.Count('id')).filter(
+            count__gt=1)
+    for duplicate in duplicates.iterator():
+        keep_id = duplicate.pop('keep_id')
+        duplicate.pop('count')
+        rows = model.objects.filter(**duplicate).exclude(id=keep_id)
+        if merge:
+            merge(keep_id, rows)
+        rows.delete()
+
+
+def delete_duplicate_rows(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeTag = apps.get_model('recipes', 'RecipeTag')
+    Favorites = apps.get_model('recipes', 'Favorites')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    def merge_amounts(keep_id, rows):
+        # Количество в списках покупок уже учитывает все строки.
+        RecipeIngredient.objects.filter(id=keep_id).update(
+            amount=models.F('amount') + rows.aggregate(
+                total=models.Sum('amount'))['total'])
+
+    users = set()
+
+    def collect_users(keep_id, rows):
+        users.update(rows.values_list('user_id', flat=True))
+
+    delete_duplicates(RecipeIngredient, ['recipe', 'ingredients'],
+                      merge_amounts)
+    delete_duplicates(RecipeTag, ['recipe', 'tag'])
+    delete_duplicates(Favorites, ['user', 'recipe'])
+    delete_duplicates(ShoppingCart, ['user', 'recipe'], collect_users)
+
+    # Повторы рецептов в корзине учитывались в списках покупок,
+    # поэтому списки этих пользователей собираются заново.
+    if users:
+        ShoppingListItem.objects.filter(user_id__in=users).delete()
+        items = RecipeIngredient.objects.filter(
+            recipe__shoppingcart__user__in=users).values(
+            'recipe__shoppingcart__user', 'ingredients').annotate(
+                total_amount=models.Sum('amount'))
+        ShoppingListItem.objects.bulk_create(
+            (ShoppingListItem(user_id=item['recipe__shoppingcart__user'],
+                              ingredient_id=item['ingredients'],
+                              amount=item['total_amount'])
+             for item in items.iterator()),
+            batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_unique_ingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_rows,
+                             migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='ingredient',
+                    index=models.Index(django.db.models.functions.text.Lower('name'), name='ingredient_name_lower_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(create_name_index, drop_name_index),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetag',
+            index=models.Index(fields=['tag', 'recipe'], name='recipe_tag_tag_recipe_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorites',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorites'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredients'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipetag',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:10
+
+import core.counters
+from django.db import migrations
+
+
+def fill_counters(apps, schema_editor):
+    core.counters.recount(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_relation_constraints'),
+        ('users', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=core.counters.CounterField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=core.counters.CounterField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:13
+
+import core.tag_mask
+from django.db import migrations, models
+
+
+def fill_tags_mask(apps, schema_editor):
+    core.tag_mask.assign_tag_bits(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит маски'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
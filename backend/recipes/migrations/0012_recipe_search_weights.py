@@ -0,0 +1,41 @@
+from django.db import migrations
+
+SEARCH_CONFIG = 'russian'
+SEARCH_INDEX_NAME = 'recipe_search_idx'
+
+
+def get_index(weighted):
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    if not weighted:
+        return GinIndex(SearchVector('name', 'text', config=SEARCH_CONFIG),
+                        name=SEARCH_INDEX_NAME)
+    return GinIndex(
+        SearchVector('name', config=SEARCH_CONFIG, weight='A')
+        + SearchVector('text', config=SEARCH_CONFIG, weight='B'),
+        name=SEARCH_INDEX_NAME)
+
+
+def replace_index(weighted):
+    def replace(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        Recipe = apps.get_model('recipes', 'Recipe')
+        schema_editor.remove_index(Recipe, get_index(not weighted))
+        schema_editor.add_index(Recipe, get_index(weighted))
+    return replace
+
+
+class Migration(migrations.Migration):
+    """Индекс поиска PostgreSQL с весами названия и описания,
+    как в core.search.search_vector.
+    """
+
+    dependencies = [
+        ('recipes', '0011_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(replace_index(True), replace_index(False)),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+import core.feed
+
+
+def fill_timelines(apps, schema_editor):
+    """Рецепты авторов сверх порога подписчиков не были в лентах."""
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(
+        author__followers_count__gt=settings.FEED_FANOUT_LIMIT).update(
+            fanned_out=False)
+    core.feed.rebuild_timelines(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search_weights'),
+        ('users', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='Записан в ленты подписчиков'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('fanned_out', False)), fields=['author', '-pub_date', '-id'], name='recipe_not_fanned_out_idx'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,16 @@
+import os
+from uuid import uuid4
+
 from colorfield.fields import ColorField
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models.functions import Lower
 
 from core.constance import (MAX_LENGTH_COLOR, MAX_LENGTH_MEASUREMENT_UNIT,
                             MAX_LENGTH_NAME, MAX_LENGTH_SLUG)
+from core.counters import CounterField, CountersModel
 
 User = get_user_model()
 
@@ -17,6 +23,16 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'], name='unique_ingredient'
+            ),
+        ]
+        indexes = [
+            # Поиск по началу названия без учета регистра. В PostgreSQL
+            # индекс создается с varchar_pattern_ops, см. миграцию 0008.
+            models.Index(Lower('name'), name='ingredient_name_lower_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,6 +43,9 @@ class Tag(models.Model):
     color = ColorField("Код цвета", default="#000000",
                        max_length=MAX_LENGTH_COLOR)
     slug = models.SlugField('Слаг', max_length=MAX_LENGTH_SLUG, unique=True)
+    # Номер бита в Recipe.tags_mask, см. core.tag_mask.
+    bit = models.PositiveSmallIntegerField('Бит маски', null=True,
+                                           unique=True, editable=False)
 
     class Meta:
         verbose_name = 'Тег'
@@ -41,12 +60,14 @@ class Tag(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CountersModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                verbose_name='Автор',
                                related_name='recipes')
     name = models.CharField('Название', max_length=MAX_LENGTH_NAME)
     image = models.ImageField('Картинка', upload_to='recipes/images')
+    image_variants = models.JSONField('Копии картинки', default=dict,
+                                      blank=True, editable=False)
     text = models.TextField('Описание')
     ingredients = models.ManyToManyField('Ingredient',
                                          through='RecipeIngredient')
@@ -59,11 +80,28 @@ class Recipe(models.Model):
             MaxValueValidator(300,
                               'Не больше 300 минут')])
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    tags_mask = models.BigIntegerField('Маска тегов', default=0,
+                                       editable=False)
+    favorites_count = CounterField('В избранном')
+    shopping_cart_count = CounterField('В списках покупок')
+    fanned_out = models.BooleanField('Записан в ленты подписчиков',
+                                     default=True, editable=False)
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            # Рецепты автора и рецепты в подписках.
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            # Рецепты, которые лента подписок читает из таблицы рецептов.
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         condition=models.Q(fanned_out=False),
+                         name='recipe_not_fanned_out_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -83,6 +121,12 @@ class RecipeIngredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredients'],
+                name='unique_recipe_ingredient'
+            ),
+        ]
 
     def __str__(self):
         return self.ingredients.name
@@ -92,6 +136,18 @@ class RecipeTag(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'tag'], name='unique_recipe_tag'
+            ),
+        ]
+        indexes = [
+            # Фильтр рецептов по тегу без обращения к таблице.
+            models.Index(fields=['tag', 'recipe'],
+                         name='recipe_tag_tag_recipe_idx'),
+        ]
+
     def __str__(self):
         return self.tag.name
 
@@ -106,6 +162,11 @@ class CreatedUserRecipeModel(models.Model):
 
     class Meta:
         abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_%(class)s'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -113,12 +174,97 @@ class CreatedUserRecipeModel(models.Model):
 
 class ShoppingCart(CreatedUserRecipeModel):
 
-    class Meta:
+    class Meta(CreatedUserRecipeModel.Meta):
         verbose_name = 'Список покупок в корзине'
 
 
 class Favorites(CreatedUserRecipeModel):
 
-    class Meta:
+    class Meta(CreatedUserRecipeModel.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранные рецепты'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Обновляется при добавлении и удалении рецептов из списка покупок
+    и при изменении ингредиентов рецептов, которые в нем находятся.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shopping_list')
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'], name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Строки добавляются при публикации рецепта и при подписке
+    на автора, дата публикации копируется для чтения ленты
+    по индексу без обращения к рецептам.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='timeline_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+')
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class ImageUpload(models.Model):
+    """Картинка рецепта, загружаемая по частям.
+
+    Токен загрузки передается в поле image рецепта вместо base64.
+    """
+    token = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='image_uploads')
+    size = models.PositiveIntegerField('Размер')
+    offset = models.PositiveIntegerField('Загружено', default=0)
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Загрузка картинки'
+        verbose_name_plural = 'Загрузки картинок'
+
+    def __str__(self):
+        return str(self.token)
+
+    @property
+    def path(self):
+        return os.path.join(settings.UPLOAD_ROOT, self.token.hex)
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
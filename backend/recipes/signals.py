@@ -0,0 +1,81 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.catalog import bump_catalog_version
+from core.shopping_list import (update_cart_shopping_list,
+                                update_ingredient_shopping_lists)
+from core.tag_mask import assign_tag_bits, release_tag_bit
+from recipes.models import Ingredient, RecipeIngredient, ShoppingCart, Tag
+
+# Поля, от которых зависят списки покупок.
+SHOPPING_LIST_FIELDS = {
+    ShoppingCart: ('user_id', 'recipe_id'),
+    RecipeIngredient: ('recipe_id', 'ingredients_id', 'amount'),
+}
+UPDATE_SHOPPING_LISTS = {
+    ShoppingCart: update_cart_shopping_list,
+    RecipeIngredient: update_ingredient_shopping_lists,
+}
+
+
+@receiver(pre_delete, sender=Tag)
+def release_bit(instance, **kwargs):
+    release_tag_bit(instance)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def assign_bits(signal, instance, **kwargs):
+    """Бит новому тегу или тегу, ожидавшему освободившийся бит."""
+    if instance.bit is None or signal is post_delete:
+        assign_tag_bits()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=Tag)
+def update_catalog_version(**kwargs):
+    """Новая версия справочников после изменения тегов и ингредиентов."""
+    bump_catalog_version()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_shopping_list_fields(sender, instance, **kwargs):
+    """Сохраненные значения изменяемой строки, например, в админке."""
+    if not instance._state.adding:
+        instance.saved_shopping_list_row = sender.objects.filter(
+            pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=RecipeIngredient)
+def add_to_shopping_lists(sender, instance, created, **kwargs):
+    """Списки покупок после добавления или изменения строки.
+
+    bulk_create и bulk_update сигналов не отправляют, списки покупок
+    для них обновляет вызывающий код.
+    """
+    update = UPDATE_SHOPPING_LISTS[sender]
+    saved = getattr(instance, 'saved_shopping_list_row', None)
+    instance.saved_shopping_list_row = None
+    if saved is not None:
+        fields = SHOPPING_LIST_FIELDS[sender]
+        if all(getattr(saved, field) == getattr(instance, field)
+               for field in fields):
+            return
+        update(saved, sign=-1)
+    elif not created:
+        return
+    update(instance)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=RecipeIngredient)
+def remove_from_shopping_lists(sender, instance, **kwargs):
+    """Списки покупок после удаления строки.
+
+    При каскадном удалении рецепта пара корзина-ингредиент
+    вычитается один раз: обработчик той строки, которая удалена
+    первой, еще видит вторую, а обработчик второй - уже нет.
+    """
+    UPDATE_SHOPPING_LISTS[sender](instance, sign=-1)
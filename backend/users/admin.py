@@ -6,9 +6,11 @@ from users.models import Follow, User
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email', 'first_name', 'last_name')
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     list_filter = ('username', 'email')
     search_fields = ('username', 'email', 'first_name', 'last_name')
+    readonly_fields = ('recipes_count', 'followers_count', 'following_count')
     empty_value_display = EMPTY_VALUE_DISPLAY
 
 
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:10
+
+import core.counters
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_remove_follow_prevent_self_follow_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=core.counters.CounterField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=core.counters.CounterField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=core.counters.CounterField(default=0, editable=False, verbose_name='Рецептов'),
+        ),
+    ]
@@ -2,10 +2,11 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 from core.constance import MAX_LENGTH_EMAIL, MAX_LENGTH_USER_NAME
+from core.counters import CounterField, CountersModel
 from core.validators import validate_username
 
 
-class User(AbstractUser):
+class User(CountersModel, AbstractUser):
     email = models.EmailField(
         'Почта', max_length=MAX_LENGTH_EMAIL, unique=True
     )
@@ -14,6 +15,9 @@ class User(AbstractUser):
         validators=[validate_username])
     first_name = models.CharField('Имя', max_length=MAX_LENGTH_USER_NAME)
     last_name = models.CharField('Фамилия', max_length=MAX_LENGTH_USER_NAME)
+    recipes_count = CounterField('Рецептов')
+    followers_count = CounterField('Подписчиков')
+    following_count = CounterField('Подписок')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -26,6 +30,14 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    def refresh_from_db(self, using=None, fields=None):
+        # Пользователь из JWT создается только с id, при обращении
+        # к любому полю все отложенные поля загружаются одним запросом.
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred.issuperset(fields):
+            fields = list(deferred)
+        super().refresh_from_db(using, fields)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -50,3 +62,17 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class DeniedToken(models.Model):
+    """Отозванный refresh-токен JWT, хранится до истечения токена."""
+    jti = models.CharField('Идентификатор токена', max_length=255,
+                           unique=True)
+    expires_at = models.DateTimeField('Истекает', db_index=True)
+
+    class Meta:
+        verbose_name = 'Отозванный токен'
+        verbose_name_plural = 'Отозванные токены'
+
+    def __str__(self):
+        return self.jti
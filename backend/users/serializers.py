@@ -2,6 +2,9 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 
+from core.images import get_image_variants
+from core.loaders import LoaderListSerializer, SubscriptionLoader, get_loader
+from core.utils import get_recipes_limit
 from recipes.models import Recipe
 from users.models import Follow
 
@@ -10,11 +13,16 @@ User = get_user_model()
 
 class AlterRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для рецептов в подписках."""
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = "id", "name", "image", "cooking_time"
+        fields = "id", "name", "image", "image_variants", "cooking_time"
         read_only_fields = ("__all__",)
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
+
 
 class CustomUserSerializer(UserSerializer):
     """Сериализатор для получения информации о пользователе."""
@@ -24,21 +32,25 @@ class CustomUserSerializer(UserSerializer):
         model = User
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed')
+        list_serializer_class = LoaderListSerializer
+
+    def preload(self, instances):
+        get_loader(self.context.get('request'), SubscriptionLoader).load(
+            user.id for user in instances)
+
+    async def apreload(self, instances):
+        await get_loader(self.context.get('request'),
+                         SubscriptionLoader).aload(
+            user.id for user in instances)
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=self.context['request'].user,
-                                     author=obj).exists()
+        return get_loader(self.context.get('request'),
+                          SubscriptionLoader).is_subscribed(obj)
 
 
 class FollowGetSerializer(CustomUserSerializer):
     """Сериализатор для получения информации о подписках."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        source='recipes.count', read_only=True
-    )
 
     class Meta(CustomUserSerializer.Meta):
         model = User
@@ -48,17 +60,24 @@ class FollowGetSerializer(CustomUserSerializer):
                             'last_name',
                             'is_subscribed', 'recipes', 'recipes_count')
 
+    def preload(self, instances):
+        """Пользователь подписан на всех авторов, загружать нечего."""
+
+    async def apreload(self, instances):
+        """Пользователь подписан на всех авторов, загружать нечего."""
+
+    def get_is_subscribed(self, obj):
+        return True
+
     def get_recipes(self, obj):
         user = self.context['request'].user
         request = self.context.get('request')
         if user.is_anonymous:
             return
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if not recipes_limit:
-            return AlterRecipeSerializer(recipes, many=True).data
-        return AlterRecipeSerializer(recipes[:int(recipes_limit)],
-                                     many=True).data
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[:get_recipes_limit(request)]
+        return AlterRecipeSerializer(recipes, many=True).data
 
 
 class FollowPostSerializer(serializers.ModelSerializer):
@@ -1,7 +1,8 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from users.views import FollowingViewSet
+from users.views import FollowingViewSet, JWTLogoutView
 
 users_router = DefaultRouter()
 
@@ -11,3 +12,8 @@ users_router.register('users', FollowingViewSet)
 urlpatterns = [
     path('', include(users_router.urls)),
     path('auth/', include('djoser.urls.authtoken')), ]
+
+if settings.JWT_ENABLED:
+    urlpatterns += [
+        path('auth/jwt/logout/', JWTLogoutView.as_view(), name='jwt-logout'),
+        path('auth/', include('djoser.urls.jwt')), ]
@@ -1,19 +1,30 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Prefetch
 from django.db.utils import IntegrityError
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from api.mixins import AsyncReadMixin, ReplicaReadMixin
+from core.authentication import TokenLogoutSerializer
+from core.counters import change_counter
+from core.feed import backfill_timeline, remove_from_timeline
+from core.utils import get_recipes_limit
+from recipes.models import Recipe
 from users.models import Follow
 from users.serializers import FollowGetSerializer, FollowPostSerializer
 
 User = get_user_model()
 
 
-class FollowingViewSet(UserViewSet):
+class FollowingViewSet(ReplicaReadMixin, AsyncReadMixin, UserViewSet):
     """Получение информации о подписках, создание и удаление подписок."""
+    async_actions = ('list', 'retrieve', 'subscriptions')
+
     def get_permissions(self):
         if self.action == 'me':
             return [permissions.IsAuthenticated()]
@@ -24,15 +35,33 @@ class FollowingViewSet(UserViewSet):
             permission_classes=[permissions.IsAuthenticated],
             )
     def subscriptions(self, request):
-        user = request.user
-        queryset = User.objects.filter(following__user=user)
-        page = self.paginate_queryset(queryset)
+        page = self.paginate_queryset(self.get_subscriptions())
         serializer = self.get_serializer(page, many=True,
                                          context={'request': request})
         if page is not None:
             return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
+    async def asubscriptions(self, request):
+        page = await self.apaginate_queryset(self.get_subscriptions())
+        if page is not None:
+            return self.get_paginated_response(
+                await self.aserialize(page, many=True))
+        return Response(await self.aserialize(
+            [author async for author in self.get_subscriptions()],
+            many=True))
+
+    def get_subscriptions(self):
+        recipes = Recipe.objects.only('id', 'name', 'image', 'image_variants',
+                                      'cooking_time', 'author_id')
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return User.objects.filter(
+            following__user=self.request.user).prefetch_related(
+                Prefetch('recipes', queryset=recipes,
+                         to_attr='limited_recipes')).order_by('-id')
+
     @action(detail=True, methods=['post', 'delete'],
             serializer_class=FollowPostSerializer,
             permission_classes=[permissions.IsAuthenticated, ])
@@ -47,7 +76,10 @@ class FollowingViewSet(UserViewSet):
         if request.method == 'POST':
             try:
                 serializer.is_valid(raise_exception=True)
-                serializer.save(user=self.request.user, author=author)
+                with transaction.atomic():
+                    serializer.save(user=self.request.user, author=author)
+                    self.change_counters(author, 1)
+                    backfill_timeline(self.request.user, author)
             except IntegrityError:
                 return Response('Такая подписка уже существует',
                                 status=status.HTTP_400_BAD_REQUEST)
@@ -59,7 +91,27 @@ class FollowingViewSet(UserViewSet):
                 return Response(status=status.HTTP_400_BAD_REQUEST,
                                 data='Такой подписки не существует')
             # serializer.is_valid(raise_exception=True)
-            Follow.objects.filter(user=self.request.user,
-                                  author=author).delete()
+            with transaction.atomic():
+                deleted, _ = Follow.objects.filter(user=self.request.user,
+                                                   author=author).delete()
+                self.change_counters(author, -deleted)
+                remove_from_timeline(self.request.user, author)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def change_counters(self, author, delta):
+        change_counter(User, author.id, 'followers_count', delta)
+        change_counter(User, self.request.user.id, 'following_count', delta)
+
+
+class JWTLogoutView(APIView):
+    """Выход: refresh-токен отзывается, access-токен действует
+    до истечения срока.
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        serializer = TokenLogoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(status=status.HTTP_204_NO_CONTENT)
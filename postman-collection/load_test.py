@@ -0,0 +1,375 @@
+"""Нагрузочный прогон postman-коллекции.
+
+Скрипт читает diploma.postman_collection.json и выполняет запросы
+коллекции по порядку в нескольких потоках - виртуальных пользователях.
+Переменные коллекции подставляются так же, как в Postman, значения из
+ответов (id, токены, слаги) сохраняются по вызовам
+pm.collectionVariables.set в тестах запросов. Каждый виртуальный
+пользователь регистрирует своих пользователей, поэтому потоки
+не мешают друг другу.
+
+Пример:
+    python load_test.py --users 10 --iterations 5 --output after.json
+    python load_test.py --users 10 --duration 60 --compare before.json
+
+Нужен только стандартный питон, зависимости проекта не используются.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import quote, urlsplit
+
+COLLECTION = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'diploma.postman_collection.json')
+
+# Переменные с именами и почтами пользователей, к ним добавляется
+# суффикс виртуального пользователя и итерации.
+IDENTITY_VARIABLES = ('username', 'email', 'secondUserUsername',
+                      'secondUserEmail', 'thirdUserUsername',
+                      'thirdUserEmail')
+
+VARIABLE = re.compile(r'{{\s*(\w+)\s*}}')
+EXPECTED_STATUS = re.compile(r'должен быть (\d{3})')
+SET_VARIABLE = re.compile(
+    r'pm\.(?:collectionVariables|environment|globals|variables)\.set\(\s*'
+    r'["\'](\w+)["\']\s*,\s*([^;\n]+?)\s*\);?\s*$', re.MULTILINE)
+GET_DEFINITION = re.compile(
+    r'(?:const|let|var)\s+(\w+)\s*=\s*_\.get\(\s*responseData\s*,'
+    r'\s*["\']([\w.\[\]]+)["\']\s*\)')
+ACCESSOR = re.compile(r'\[(\d+)\]|\.(\w+)(?:\((\d+)\s*,\s*(\d+)\))?')
+
+
+class Step:
+    """Запрос коллекции с ожидаемым статусом и сохраняемыми
+    переменными.
+    """
+
+    def __init__(self, path, request, auth, script):
+        self.path = path
+        self.method = request['method']
+        url = request['url']
+        self.url = url['raw'] if isinstance(url, dict) else url
+        self.headers = [(header['key'], header['value'])
+                        for header in request.get('header', [])
+                        if not header.get('disabled')]
+        body = request.get('body') or {}
+        self.body = body.get('raw') if body.get('mode') == 'raw' else None
+        if self.body is not None:
+            self.headers.append(('Content-Type', 'application/json'))
+        if auth and auth['type'] == 'apikey':
+            options = {item['key']: item['value'] for item in auth['apikey']}
+            self.headers.append((options['key'], options['value']))
+        expected = EXPECTED_STATUS.findall(script)
+        self.expected = int(expected[0]) if expected else None
+        definitions = dict(GET_DEFINITION.findall(script))
+        self.extract = [(name, definitions.get(expression, expression))
+                        for name, expression in SET_VARIABLE.findall(script)]
+        self.endpoint = (
+            f'{self.method} {VARIABLE.sub(self.placeholder, self.url)}')
+
+    @staticmethod
+    def placeholder(match):
+        return '' if match.group(1) == 'baseUrl' else match.group(0)
+
+
+def load_steps(path, exclude=None):
+    """Запросы коллекции в порядке выполнения с учетом авторизации
+    папок.
+    """
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    variables = {variable['key']: variable['value']
+                 for variable in collection.get('variable', [])}
+    steps = []
+
+    def walk(items, parents, auth):
+        for item in items:
+            path = parents + [item['name'].strip()]
+            if 'item' in item:
+                walk(item['item'], path, item.get('auth', auth))
+                continue
+            name = ' / '.join(path)
+            if exclude and exclude.search(name):
+                continue
+            script = '\n'.join(
+                line for event in item.get('event', [])
+                if event['listen'] == 'test'
+                for line in event['script']['exec'])
+            request = item['request']
+            steps.append(Step(name, request, request.get('auth', auth),
+                              script))
+
+    walk(collection['item'], [], collection.get('auth'))
+    return steps, variables
+
+
+def evaluate(expression, data):
+    """Значение из ответа по выражению вида responseData[0].name
+    или пути _.get вида id.
+    """
+    expression = expression.strip()
+    if expression.startswith('responseData'):
+        expression = expression[len('responseData'):]
+    else:
+        expression = '.' + expression
+    value = data
+    for index, key, start, end in ACCESSOR.findall(expression):
+        if index:
+            value = value[int(index)]
+        elif key == 'slice':
+            value = value[int(start):int(end)]
+        else:
+            value = value[key]
+    return value
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, endpoint, latency, error):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + error
+
+
+def percentile(values, share):
+    """Перцентиль по ближайшему рангу."""
+    index = max(0, min(len(values) - 1,
+                       math.ceil(share * len(values)) - 1))
+    return values[index]
+
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'error_rate': round(errors / len(latencies), 4),
+        'rps': round(len(latencies) / duration, 2),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+class VirtualUser(threading.Thread):
+    """Поток, который выполняет коллекцию от начала до конца
+    заданное число раз или до конца отведенного времени.
+    """
+
+    def __init__(self, number, steps, variables, options, stats, run_id):
+        super().__init__(daemon=True)
+        self.number = number
+        self.steps = steps
+        self.initial = variables
+        self.options = options
+        self.stats = stats
+        self.run_id = run_id
+        self.connection = None
+
+    def run(self):
+        iteration = 0
+        while True:
+            if self.options.duration:
+                if time.monotonic() >= self.options.deadline:
+                    break
+            elif iteration >= self.options.iterations:
+                break
+            self.variables = self.identity(iteration)
+            for step in self.steps:
+                self.execute(step)
+            iteration += 1
+        if self.connection:
+            self.connection.close()
+
+    def identity(self, iteration):
+        """Переменные итерации с уникальными именами пользователей."""
+        suffix = f'{self.run_id}-{self.number}-{iteration}'
+        variables = dict(self.initial)
+        for name in IDENTITY_VARIABLES:
+            value = variables.get(name)
+            if not value:
+                continue
+            quoted = value.startswith('"')
+            value = value.strip('"')
+            if '@' in value:
+                local, domain = value.split('@', 1)
+                value = f'{local}-{suffix}@{domain}'
+            else:
+                value = f'{value}-{suffix}'
+            variables[name] = f'"{value}"' if quoted else value
+        return variables
+
+    def substitute(self, text):
+        return VARIABLE.sub(
+            lambda match: str(self.variables.get(match.group(1),
+                                                 match.group(0))),
+            text)
+
+    def execute(self, step):
+        url = urlsplit(self.substitute(step.url))
+        target = quote(url.path + (f'?{url.query}' if url.query else ''),
+                       safe='/?&=%:+,;@')
+        headers = {key: self.substitute(value)
+                   for key, value in step.headers}
+        if not self.options.keep_alive:
+            headers['Connection'] = 'close'
+        body = (self.substitute(step.body).encode()
+                if step.body is not None else None)
+
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(
+                    url.netloc, timeout=self.options.timeout)
+            self.connection.request(step.method, target, body, headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+            if not self.options.keep_alive:
+                self.connection.close()
+                self.connection = None
+        except (OSError, http.client.HTTPException):
+            # Соединение не создано, если адрес неверный.
+            if self.connection:
+                self.connection.close()
+            self.connection = None
+            self.stats.add(step.endpoint, time.perf_counter() - start, 1)
+            return
+        latency = time.perf_counter() - start
+
+        if step.expected is not None:
+            error = status != step.expected
+        else:
+            error = status >= 500
+        self.stats.add(step.endpoint, latency, int(error))
+        if error or not step.extract:
+            return
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return
+        for name, expression in step.extract:
+            try:
+                self.variables[name] = evaluate(expression, data)
+            except (KeyError, IndexError, TypeError):
+                pass
+
+
+def compare(results, baseline, threshold):
+    """Изменение p95 относительно прошлого запуска.
+
+    Возвращает адреса, у которых p95 вырос больше чем на threshold
+    процентов.
+    """
+    regressions = []
+    print(f'\n{"Адрес":<70} {"p95 было":>9} {"p95 стало":>9} {"%":>7}')
+    for endpoint, current in results['endpoints'].items():
+        previous = baseline['endpoints'].get(endpoint)
+        if not previous or not previous['p95_ms']:
+            continue
+        change = (current['p95_ms'] / previous['p95_ms'] - 1) * 100
+        mark = ''
+        if change > threshold:
+            regressions.append(endpoint)
+            mark = ' !'
+        print(f'{endpoint[:70]:<70} {previous["p95_ms"]:>9} '
+              f'{current["p95_ms"]:>9} {change:>+7.1f}{mark}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный прогон postman-коллекции')
+    parser.add_argument('--collection', default=COLLECTION)
+    parser.add_argument('--base-url',
+                        help='Адрес сервера вместо переменной baseUrl')
+    parser.add_argument('--users', type=int, default=10,
+                        help='Количество виртуальных пользователей')
+    parser.add_argument('--iterations', type=int, default=1,
+                        help='Прогонов коллекции на пользователя')
+    parser.add_argument('--duration', type=float,
+                        help='Длительность в секундах вместо --iterations')
+    parser.add_argument('--exclude',
+                        help='Регулярное выражение для пропуска запросов '
+                             'по пути в коллекции, например bad_requests')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--keep-alive', action='store_true',
+                        help='Не закрывать соединение после ответа. '
+                             'С runserver дает задержку 40 мс на запрос')
+    parser.add_argument('--output', help='Файл для результатов в json')
+    parser.add_argument('--compare',
+                        help='Результаты прошлого запуска для сравнения')
+    parser.add_argument('--threshold', type=float, default=20,
+                        help='Допустимый рост p95 в процентах')
+    options = parser.parse_args()
+
+    steps, variables = load_steps(
+        options.collection,
+        re.compile(options.exclude) if options.exclude else None)
+    if options.base_url:
+        variables['baseUrl'] = options.base_url.rstrip('/')
+
+    stats = Stats()
+    run_id = uuid.uuid4().hex[:6]
+    started = time.monotonic()
+    if options.duration:
+        options.deadline = started + options.duration
+    users = [VirtualUser(number, steps, variables, options, stats, run_id)
+             for number in range(options.users)]
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    duration = time.monotonic() - started
+
+    endpoints = {
+        endpoint: summarize(latencies, stats.errors[endpoint], duration)
+        for endpoint, latencies in stats.latencies.items()
+    }
+    total = summarize(
+        [latency for latencies in stats.latencies.values()
+         for latency in latencies],
+        sum(stats.errors.values()), duration)
+    results = {
+        'base_url': variables['baseUrl'],
+        'users': options.users,
+        'iterations': None if options.duration else options.iterations,
+        'duration_s': round(duration, 2),
+        'total': total,
+        'endpoints': endpoints,
+    }
+
+    print(f'{"Адрес":<70} {"запр.":>6} {"ошиб.":>6} {"rps":>7} '
+          f'{"p50":>7} {"p95":>7} {"p99":>7}')
+    for endpoint, result in list(endpoints.items()) + [('Всего', total)]:
+        print(f'{endpoint[:70]:<70} {result["requests"]:>6} '
+              f'{result["errors"]:>6} {result["rps"]:>7} '
+              f'{result["p50_ms"]:>7} {result["p95_ms"]:>7} '
+              f'{result["p99_ms"]:>7}')
+    print(f'\nВремя: {duration:.1f} с, ошибок: '
+          f'{total["error_rate"] * 100:.2f}%')
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
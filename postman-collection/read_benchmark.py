@@ -0,0 +1,256 @@
+"""Пропускная способность WSGI и ASGI на запросах чтения.
+
+Скрипт отправляет GET-запросы к спискам и страницам рецептов, тегам,
+ингредиентам, пользователям и подпискам через заданное число
+одновременных соединений и для каждого сервера выводит запросы
+в секунду, ошибки и p50/p95/p99 времени ответа. Серверы запускаются
+заранее на одной базе данных с одинаковым числом процессов, например
+из каталога backend:
+
+    gunicorn foodgram.wsgi:application --workers 4 --bind 127.0.0.1:8001
+    gunicorn -c gunicorn_asgi.py --workers 4 --bind 127.0.0.1:8002
+
+    python read_benchmark.py --concurrency 200 --duration 30 \\
+        --target wsgi=http://127.0.0.1:8001 \\
+        --target asgi=http://127.0.0.1:8002 --token <токен>
+
+Нужен только стандартный питон, зависимости проекта не используются.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+from load_test import summarize
+
+# Адреса чтения, {recipe}, {user} и {tag} заменяются на id и слаги
+# из ответов сервера.
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?page=2',
+    '/api/recipes/?limit=6&tags={tag}',
+    '/api/recipes/{recipe}/',
+    '/api/tags/',
+    '/api/ingredients/?name=' + quote('мол'),
+    '/api/users/',
+    '/api/users/{user}/',
+)
+AUTHENTICATED_PATHS = (
+    '/api/recipes/?is_favorited=1',
+    '/api/users/subscriptions/?recipes_limit=3',
+)
+
+
+class Connection:
+    """Соединение HTTP/1.1, открывается заново, если сервер его закрыл."""
+
+    def __init__(self, host, port, headers, timeout):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port)
+        request = [f'GET {path} HTTP/1.1', f'Host: {self.host}']
+        request += [f'{name}: {value}' for name, value in self.headers]
+        self.writer.write(('\r\n'.join(request) + '\r\n\r\n').encode())
+        try:
+            return await asyncio.wait_for(self.read(), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def read(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Сервер закрыл соединение')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            body = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                body += chunk[:-2]
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(
+                int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+def get_headers(options):
+    headers = [('Accept', 'application/json')]
+    if options.token:
+        headers.append(('Authorization', f'Token {options.token}'))
+    if not options.keep_alive:
+        headers.append(('Connection', 'close'))
+    return headers
+
+
+async def get_paths(base_url, options):
+    """Адреса с id рецептов, тегов и пользователей из базы сервера."""
+    url = urlsplit(base_url)
+    connection = Connection(url.hostname, url.port or 80,
+                            get_headers(options), options.timeout)
+
+    async def get_json(path):
+        status, body = await connection.get(path)
+        if status != 200:
+            raise RuntimeError(f'{path}: ответ {status}')
+        return json.loads(body)
+
+    recipes = (await get_json('/api/recipes/?limit=50'))['results']
+    users = (await get_json('/api/users/?limit=50'))['results']
+    tags = await get_json('/api/tags/')
+    connection.close()
+    if not recipes or not users or not tags:
+        raise RuntimeError('В базе нет рецептов, пользователей или тегов, '
+                           'заполните ее командой generate_dataset')
+
+    templates = PATHS + (AUTHENTICATED_PATHS if options.token else ())
+    return [
+        template.format(recipe=recipes[index % len(recipes)]['id'],
+                        user=users[index % len(users)]['id'],
+                        tag=tags[index % len(tags)]['slug'])
+        for index in range(50) for template in templates]
+
+
+async def run_client(url, paths, options, deadline, stats):
+    connection = Connection(url.hostname, url.port or 80,
+                            get_headers(options), options.timeout)
+    for path in itertools.cycle(paths):
+        if time.monotonic() >= deadline:
+            break
+        started = time.monotonic()
+        try:
+            status, _ = await connection.get(path)
+            error = status != 200
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ValueError, IndexError):
+            error = True
+        endpoint = path.split('?')[0].rstrip('/').rsplit('/', 1)
+        endpoint = ('/'.join(endpoint[:-1]) + '/{id}'
+                    if endpoint[-1].isdigit() else '/'.join(endpoint))
+        latencies, errors = stats.setdefault(endpoint, ([], [0]))
+        latencies.append(time.monotonic() - started)
+        errors[0] += error
+    connection.close()
+
+
+async def benchmark(name, base_url, options):
+    url = urlsplit(base_url)
+    paths = await get_paths(base_url, options)
+    # Прогрев: кэши справочников, индекс ингредиентов, соединения.
+    warmup = {}
+    await asyncio.gather(*(
+        run_client(url, paths[number:] + paths[:number], options,
+                   time.monotonic() + options.warmup, warmup)
+        for number in range(min(options.concurrency, 20))))
+
+    stats = {}
+    started = time.monotonic()
+    deadline = started + options.duration
+    await asyncio.gather(*(
+        run_client(url, paths[number % len(paths):]
+                   + paths[:number % len(paths)],
+                   options, deadline, stats)
+        for number in range(options.concurrency)))
+    duration = time.monotonic() - started
+
+    endpoints = {
+        endpoint: summarize(latencies, errors[0], duration)
+        for endpoint, (latencies, errors) in sorted(stats.items())}
+    total = summarize(
+        [latency for latencies, _ in stats.values()
+         for latency in latencies],
+        sum(errors[0] for _, errors in stats.values()), duration)
+    return {'name': name, 'base_url': base_url,
+            'duration_s': round(duration, 2), 'total': total,
+            'endpoints': endpoints}
+
+
+def print_results(results):
+    print(f'\n{results["name"]} ({results["base_url"]})')
+    print(f'{"Адрес":<40} {"запр.":>7} {"ошиб.":>6} {"rps":>8} '
+          f'{"p50":>7} {"p95":>7} {"p99":>7}')
+    for endpoint, result in (list(results['endpoints'].items())
+                             + [('Всего', results['total'])]):
+        print(f'{endpoint[:40]:<40} {result["requests"]:>7} '
+              f'{result["errors"]:>6} {result["rps"]:>8} '
+              f'{result["p50_ms"]:>7} {result["p95_ms"]:>7} '
+              f'{result["p99_ms"]:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Сравнение WSGI и ASGI на запросах чтения')
+    parser.add_argument('--target', action='append', required=True,
+                        metavar='ИМЯ=АДРЕС',
+                        help='Сервер, например wsgi=http://127.0.0.1:8001')
+    parser.add_argument('--concurrency', type=int, default=200,
+                        help='Одновременных соединений')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Длительность замера для сервера в секундах')
+    parser.add_argument('--warmup', type=float, default=5,
+                        help='Прогрев перед замером в секундах')
+    parser.add_argument('--token',
+                        help='Токен djoser, добавляет запросы избранного '
+                             'и подписок')
+    parser.add_argument('--keep-alive', action='store_true',
+                        help='Не закрывать соединение после ответа. '
+                             'Синхронные процессы gunicorn все равно '
+                             'закрывают его')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='Файл для результатов в json')
+    options = parser.parse_args()
+
+    results = []
+    for target in options.target:
+        name, _, base_url = target.partition('=')
+        results.append(asyncio.run(
+            benchmark(name, base_url.rstrip('/'), options)))
+        print_results(results[-1])
+
+    baseline = results[0]['total']['rps']
+    print(f'\n{"Сервер":<20} {"rps":>8} {"к первому":>10} {"p99":>8}')
+    for result in results:
+        total = result['total']
+        ratio = total['rps'] / baseline if baseline else 0
+        print(f'{result["name"]:<20} {total["rps"]:>8} {ratio:>9.2f}x '
+              f'{total["p99_ms"]:>8}')
+
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if any(result['total']['errors'] for result in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()